@@ -0,0 +1,147 @@
+'''
+A local stand-in for the quiz site's API, for benchmarking without a real SecretStuff
+'''
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+
+ENDPOINTS = ("ANSWERS", "USER", "CREATE_QUIZ", "SET_QUIZ")
+
+
+class FakeSecretStuff:
+    '''
+    Looks like SecretStuff to post: urls for every endpoint and a secure_payload that passes the payload through
+    '''
+
+    def __init__(self, base_url):
+        self.urls = {endpoint: "{}/{}".format(base_url, endpoint)
+                     for endpoint in ENDPOINTS}
+
+    def secure_payload(self, payload):
+        return payload
+
+
+def make_answers_data(n_answers, n_questions=20, quiz_number=1, seed=0):
+    '''
+    Build an ANSWERS payload with n_answers answers spread over n_questions questions, with a mix of right, differently cased, listed, wrong and blank answers
+    '''
+    rng = random.Random(seed)
+    n_users = max(1, n_answers // n_questions)
+    questions = []
+    answer_id = 0
+    for question_num in range(n_questions):
+        question_type = question_num % 2
+        if question_type == 1:
+            key = ["Alpha {}".format(question_num),
+                   "Beta {}".format(question_num)]
+        else:
+            key = ["Gamma {}".format(question_num)]
+        choices = [key[0], key[0].lower(), " {} ".format(key[0].upper()), ", ".join(key), json.dumps(key),
+                   key[0][:-1], "wrong", ""]
+        user_answers = []
+        for user_num in range(n_users):
+            if answer_id == n_answers:
+                break
+            answer_id += 1
+            user_answers.append({"userID": user_num, "answerID": answer_id,
+                                 "answerText": rng.choice(choices)})
+        questions.append({"questionText": "Question {}?".format(question_num),
+                          "questionAnswer": {"answer": key, "type": question_type},
+                          "userAnswers": user_answers})
+    return {"quizNumber": quiz_number, "questions": questions}
+
+
+class MockQuizAPI:
+    '''
+    A threaded HTTP server serving ANSWERS, USER, CREATE_QUIZ and SET_QUIZ. Every request waits latency seconds first. quizzes maps quiz numbers to ANSWERS payloads; the current quiz is served for a quizNumber of None
+    '''
+
+    def __init__(self, quizzes=None, latency=0.0, host="127.0.0.1", port=0):
+        self.quizzes = {} if quizzes is None else quizzes
+        self.latency = latency
+        self.current_quiz = max(self.quizzes) if self.quizzes else 0
+        self.requests = dict.fromkeys(ENDPOINTS, 0)
+        self._encoded = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return "http://{}:{}".format(*self._server.server_address)
+
+    def secret(self):
+        return FakeSecretStuff(self.base_url)
+
+    def _answers(self, quiz_number):
+        if quiz_number is None:
+            quiz_number = self.current_quiz
+        # Encoding a large payload dwarfs the request itself, so only do it once
+        if quiz_number not in self._encoded:
+            # An empty quiz rather than a failed request for a quiz that does not exist (or when none is live)
+            self._encoded[quiz_number] = json.dumps(self.quizzes.get(
+                quiz_number, {"quizNumber": quiz_number, "questions": []})).encode()
+        return self._encoded[quiz_number]
+
+    def _respond(self, endpoint, payload):
+        with self._lock:
+            self.requests[endpoint] += 1
+        if endpoint == "ANSWERS":
+            return self._answers(payload["quizNumber"])
+        if endpoint == "USER":
+            return json.dumps({"id": payload["id"], "email": "user{}@example.com".format(payload["id"])}).encode()
+        if endpoint == "CREATE_QUIZ":
+            with self._lock:
+                quiz_number = max(self.quizzes, default=0) + 1
+                self.quizzes[quiz_number] = {"quizNumber": quiz_number, "questions": [
+                    dict(question, userAnswers=[]) for question in payload["questions"]]}
+            return json.dumps({"quizNumber": quiz_number}).encode()
+        self.current_quiz = int(payload["quizNumber"])
+        return json.dumps({"quizNumber": self.current_quiz}).encode()
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(
+                    int(self.headers["Content-Length"])))
+                endpoint = self.path.strip("/")
+                if api.latency:
+                    sleep(api.latency)
+                if endpoint not in ENDPOINTS:
+                    self.send_error(404)
+                    return
+                body = api._respond(endpoint, payload)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
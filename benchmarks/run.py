@@ -0,0 +1,165 @@
+'''
+Benchmark the package's hot paths against a local mock of the quiz API.
+
+    python benchmarks/run.py                    # run and print timings
+    python benchmarks/run.py --save-baseline    # also save them as the baseline
+    python benchmarks/run.py --compare          # fail if anything is slower than the baseline allows
+'''
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import types
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_api import FakeSecretStuff, MockQuizAPI, make_answers_data  # noqa: E402
+
+try:
+    import gfm_trivia_helper.secretstuff  # noqa: F401
+except ImportError:
+    # The real SecretStuff is not distributed; the benchmarks only need something to import
+    secretstuff = types.ModuleType("gfm_trivia_helper.secretstuff")
+    secretstuff.SecretStuff = FakeSecretStuff
+    sys.modules["gfm_trivia_helper.secretstuff"] = secretstuff
+
+from gfm_trivia_helper import common  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES = (1000, 10000, 100000)
+
+
+@contextlib.contextmanager
+def _quiet():
+    '''
+    Swallow output and answer "n" to every prompt
+    '''
+    real_input = builtins.input
+    builtins.input = lambda prompt="": "n"
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        builtins.input = real_input
+
+
+def bench_compare_answer(api, secret, quiz_number, folder):
+    answers_data = api.quizzes[quiz_number]
+    for question in answers_data["questions"]:
+        actual_answer = question["questionAnswer"]
+        for answer in question["userAnswers"]:
+            if answer["answerText"]:
+                common._compare_answer(answer["answerText"], actual_answer)
+
+
+def bench_check_user_answers(api, secret, quiz_number, folder):
+    with _quiet():
+        common.check_user_answers({}, secret, quiz_number=quiz_number)
+
+
+def bench_export_data(api, secret, quiz_number, folder):
+    common.export_data(common.fetch_answers(secret, quiz_number), {}, secret,
+                       filename=os.path.join(folder, "export.csv"))
+
+
+def bench_view_user_answers(api, secret, quiz_number, folder):
+    with _quiet():
+        common.view_user_answers({}, secret, quiz_number=quiz_number)
+
+
+BENCHMARKS = {
+    "_compare_answer": bench_compare_answer,
+    "check_user_answers": bench_check_user_answers,
+    "export_data": bench_export_data,
+    "view_user_answers": bench_view_user_answers
+}
+
+
+def run(sizes, repeat, latency, only=None):
+    '''
+    Return the best of repeat timings, in seconds, for every benchmark at every size
+    '''
+    # Every run should pay for fetching answers, not read them off disk
+    common.ANSWERS_CACHE = None
+    # The mock has no limits to stay under, and waiting for them would swamp the timings
+    common.RATE_LIMITS = {}
+    quizzes = {size: make_answers_data(size, quiz_number=size) for size in sizes}
+    results = {}
+    with MockQuizAPI(quizzes, latency=latency) as api, tempfile.TemporaryDirectory() as folder:
+        secret = api.secret()
+        for name, benchmark in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            for size in sizes:
+                timings = []
+                for _ in range(repeat):
+                    start = perf_counter()
+                    benchmark(api, secret, size, folder)
+                    timings.append(perf_counter() - start)
+                key = "{}[{}]".format(name, size)
+                results[key] = min(timings)
+                print("{:<32} {:>10.4f}s".format(key, results[key]))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Print how results compare to the baseline and return the names of the benchmarks that regressed
+    '''
+    regressions = []
+    for key, seconds in results.items():
+        if key not in baseline:
+            continue
+        ratio = seconds / baseline[key] if baseline[key] else 1
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print("{:<32} {:>7.2f}x baseline{}".format(key, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="numbers of answers per quiz")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per benchmark; the fastest is kept")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the mock API waits before every response")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS,
+                        help="only run these benchmarks")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="baseline file to save to or compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="save the results as the baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="exit with an error if a benchmark is slower than the baseline allows")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="how much slower than the baseline counts as a regression")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.latency, args.only)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "latency": args.latency, "results": results}, f, indent=4)
+        print("! Saved baseline to {}".format(args.baseline))
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("! Regressed: {}".format(", ".join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
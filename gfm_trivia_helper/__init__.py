@@ -1,7 +1,26 @@
-from .common import *
-try:
-    from .secretstuff import SecretStuff
-except ImportError:
-    raise ValueError("Missing secretstuff module; please acquire a copy")
+import importlib
 
 __version__ = "1.0.0"
+
+
+def __getattr__(name):
+    # Load submodules only when something asks for them, so that importing the package (or running --help) stays fast
+    if name == "SecretStuff":
+        try:
+            from .secretstuff import SecretStuff
+        except ImportError:
+            raise ValueError("Missing secretstuff module; please acquire a copy")
+        return SecretStuff
+    if name.startswith("__"):
+        raise AttributeError(name)
+    common = importlib.import_module(".common", __name__)
+    try:
+        return getattr(common, name)
+    except AttributeError:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name)) from None
+
+
+def __dir__():
+    common = importlib.import_module(".common", __name__)
+    return sorted(set(globals()) | {name for name in dir(common) if not name.startswith("_")} | {"SecretStuff"})
@@ -0,0 +1,129 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import common
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncClient:
+    '''
+    Awaitable versions of the API functions. Requests go through the same pooled session as the blocking functions, on a bounded set of worker threads shared by every coroutine, so any number of calls can be awaited at once without a thread per call
+    '''
+
+    def __init__(self, secret, max_concurrency=common.POOL_SIZE):
+        self.secret = secret
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="gfm-api")
+
+    async def _run(self, f, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(f, *args, **kwargs))
+
+    async def post(self, url_type, payload, **kwargs):
+        return await self._run(common.post, url_type, payload, self.secret, **kwargs)
+
+    async def fetch_answers(self, quiz_number=None, max_age=None):
+        return await self._run(common.fetch_answers, self.secret, quiz_number, max_age)
+
+    async def create_quiz(self, questions_data):
+        return await self._run(common.create_quiz, self.secret, questions_data)
+
+    async def set_quiz(self, quiz_number):
+        return await self._run(common.set_quiz, self.secret, quiz_number)
+
+    async def get_user_data(self, user_data, user_id):
+        '''
+        Return a user's data from user_data, looking it up (and adding it) if it is not there
+        '''
+        try:
+            out = user_data[user_id]
+        except KeyError:
+            common.METRICS.record_user_lookups(misses=(user_id,))
+            out = await self.post("USER", {"id": user_id})
+            user_data[user_id] = out
+        else:
+            common.METRICS.record_user_lookups(hits=(user_id,))
+        return out
+
+    async def prefetch_user_data(self, user_data, answers_data):
+        '''
+        Look up every user in answers data that is not yet in user_data, all at once
+        '''
+        user_ids = list(common._iter_user_ids(
+            common._iter_answer_records(answers_data)))
+        missing = [user_id for user_id in user_ids if user_id not in user_data]
+        missing_set = set(missing)
+        # The missing ones are counted as they are looked up
+        common.METRICS.record_user_lookups(
+            user_id for user_id in user_ids if user_id not in missing_set)
+        await asyncio.gather(*(self.get_user_data(user_data, user_id) for user_id in missing))
+        return user_data
+
+    async def check_user_answers(self, user_data, answers_data=None, quiz_number=None, **kwargs):
+        '''
+        Fetch answers and users without blocking, then grade; keyword arguments go to grading.grade_answers
+        '''
+        from .grading import grade_answers
+        if answers_data is not None and quiz_number is not None:
+            raise ValueError("Cannot specify both answers_data and quiz_number")
+        if answers_data is None:
+            answers_data = await self.fetch_answers(quiz_number)
+        await self.prefetch_user_data(user_data, answers_data)
+        # Grading is CPU-bound (and may prompt), so keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(grade_answers, answers_data, user_data, self.secret, **kwargs))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+
+class BackgroundLoop:
+    '''
+    One event loop running in a daemon thread, for submitting coroutines from code that is not async (like the GUI)
+    '''
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="gfm-event-loop", daemon=True)
+        self._thread.start()
+
+    def submit(self, coroutine):
+        '''
+        Schedule a coroutine on the loop and return a concurrent.futures.Future for its result
+        '''
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine):
+        '''
+        Run a coroutine on the loop and block until it is done
+        '''
+        return self.submit(coroutine).result()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def get_background_loop():
+    '''
+    Return the shared background loop, starting it on first use
+    '''
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = BackgroundLoop()
+        return _LOOP
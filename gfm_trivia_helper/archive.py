@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from time import time
+
+from .common import RESULTS_FOLDER
+
+LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS quizzes (quiz_number INTEGER PRIMARY KEY, archived REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS questions (quiz_number INTEGER NOT NULL, question_num INTEGER NOT NULL, question_text TEXT NOT NULL, answer_key TEXT NOT NULL, type INTEGER NOT NULL, PRIMARY KEY (quiz_number, question_num)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS users (user_num INTEGER PRIMARY KEY, email TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS answers (quiz_number INTEGER NOT NULL, answer_id NOT NULL, question_num INTEGER NOT NULL, user_num INTEGER NOT NULL, answer_text TEXT NOT NULL, accepted INTEGER NOT NULL, PRIMARY KEY (quiz_number, answer_id)) WITHOUT ROWID",
+    # Covers per-question accuracy without touching the answers themselves
+    "CREATE INDEX IF NOT EXISTS answers_question ON answers (quiz_number, question_num, accepted)",
+    "CREATE INDEX IF NOT EXISTS answers_user ON answers (user_num, quiz_number)",
+    "CREATE TABLE IF NOT EXISTS scores (quiz_number INTEGER NOT NULL, user_num INTEGER NOT NULL, score INTEGER NOT NULL, PRIMARY KEY (quiz_number, user_num)) WITHOUT ROWID",
+    # Covers leaderboards and users' histories
+    "CREATE INDEX IF NOT EXISTS scores_user ON scores (user_num, score)",
+)
+
+
+def _in_quizzes(quiz_numbers, column="quiz_number"):
+    '''
+    Return an SQL condition (and its parameters) limiting column to quiz_numbers, or matching everything if quiz_numbers is None
+    '''
+    if quiz_numbers is None:
+        return "1", ()
+    quiz_numbers = tuple(quiz_numbers)
+    return "{} IN ({})".format(column, ", ".join("?" * len(quiz_numbers))), quiz_numbers
+
+
+class QuizArchive:
+    '''
+    Graded quizzes kept in an indexed SQLite database, for standings across a season without fetching or grading anything again. Recording a quiz again replaces what was stored for it
+    '''
+
+    def __init__(self, filename):
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def _user_nums(self, emails):
+        '''
+        Return the user number of each of emails, adding the ones not seen before
+        '''
+        emails = list(emails)
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO users (email) VALUES (?)", ((email,) for email in emails))
+        user_nums = {}
+        # Stay under SQLite's limit on parameters
+        for start in range(0, len(emails), 500):
+            chunk = emails[start:start + 500]
+            user_nums.update(self._conn.execute("SELECT email, user_num FROM users WHERE email IN ({})".format(
+                ", ".join("?" * len(chunk))), chunk))
+        return [user_nums[email] for email in emails]
+
+    def record(self, columns, accepted):
+        '''
+        Store a graded quiz: its grading.QuizColumns and the accepted array grading.accept_columns returned for them
+        '''
+        quiz_number = columns.quiz_number
+        if quiz_number is None:
+            raise ValueError("Cannot archive answers without a quiz number")
+        with self._lock, self._conn:
+            user_nums = self._user_nums(columns.users)
+            for table in ("quizzes", "questions", "answers", "scores"):
+                self._conn.execute(
+                    "DELETE FROM {} WHERE quiz_number = ?".format(table), (quiz_number,))
+            self._conn.execute(
+                "INSERT INTO quizzes (quiz_number, archived) VALUES (?, ?)", (quiz_number, time()))
+            self._conn.executemany("INSERT INTO questions (quiz_number, question_num, question_text, answer_key, type) VALUES (?, ?, ?, ?, ?)", (
+                (quiz_number, question_num, question["questionText"], json.dumps(question["questionAnswer"]["answer"]), question["questionAnswer"]["type"]) for question_num, question in enumerate(columns.questions)))
+            scores = [0] * len(columns.users)
+            rows = []
+            for row, answer_num in enumerate(columns.answer_col):
+                question_num, answer_text = columns.distinct_answers[answer_num]
+                user_num = columns.user_col[row]
+                scores[user_num] += accepted[row]
+                rows.append((quiz_number, columns.answer_ids[row], question_num,
+                             user_nums[user_num], answer_text, accepted[row]))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO answers (quiz_number, answer_id, question_num, user_num, answer_text, accepted) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT INTO scores (quiz_number, user_num, score) VALUES (?, ?, ?)", (
+                (quiz_number, user_nums[user_num], score) for user_num, score in enumerate(scores)))
+        LOGGER.debug("Archived quiz {} ({} answers)".format(
+            quiz_number, len(rows)))
+
+    def quizzes(self):
+        '''
+        Return the numbers of the archived quizzes
+        '''
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT quiz_number FROM quizzes ORDER BY quiz_number")]
+
+    def leaderboard(self, quiz_numbers=None, limit=10):
+        '''
+        Return (email, total score, quizzes played) for the top users across quiz_numbers (every archived quiz if None), best first
+        '''
+        condition, parameters = _in_quizzes(quiz_numbers)
+        with self._lock:
+            return self._conn.execute("SELECT users.email, totals.total, totals.played FROM (SELECT user_num, SUM(score) AS total, COUNT(*) AS played FROM scores WHERE {} GROUP BY user_num) AS totals JOIN users USING (user_num) ORDER BY totals.total DESC, users.email LIMIT ?".format(
+                condition), parameters + (-1 if limit is None else limit,)).fetchall()
+
+    def user_history(self, email):
+        '''
+        Return (quiz number, score, answers given) for every archived quiz a user played, in quiz order
+        '''
+        with self._lock:
+            return self._conn.execute("SELECT scores.quiz_number, scores.score, (SELECT COUNT(*) FROM answers WHERE answers.user_num = scores.user_num AND answers.quiz_number = scores.quiz_number) FROM users JOIN scores USING (user_num) WHERE users.email = ? ORDER BY scores.quiz_number", (email,)).fetchall()
+
+    def question_accuracy(self, quiz_numbers=None):
+        '''
+        Return (quiz number, question text, answers, accepted answers) for every question of quiz_numbers (every archived quiz if None)
+        '''
+        condition, parameters = _in_quizzes(
+            quiz_numbers, "questions.quiz_number")
+        with self._lock:
+            return self._conn.execute("SELECT questions.quiz_number, questions.question_text, COUNT(answers.answer_id), COALESCE(SUM(answers.accepted), 0) FROM questions LEFT JOIN answers ON answers.quiz_number = questions.quiz_number AND answers.question_num = questions.question_num WHERE {} GROUP BY questions.quiz_number, questions.question_num ORDER BY questions.quiz_number, questions.question_num".format(
+                condition), parameters).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_archive():
+    '''
+    Open the archive that lives in the results folder
+    '''
+    return QuizArchive(os.path.join(RESULTS_FOLDER, "archive.sqlite3"))
@@ -1,8 +1,15 @@
 import argparse
+import json
+import os
 import sys
 
-from .common import picker, post, _get_quiz_number, y_to_continue, check_user_answers, set_quiz, view_user_answers, create_quiz, export_data
-from .secretstuff import SecretStuff
+from .common import ANSWERS_CACHE, RESULTS_FOLDER, QUIZ_FETCH_CONCURRENCY, picker, fetch_answers, fetch_quizzes, _get_quiz_number, y_to_continue, check_user_answers, set_quiz, view_user_answers, create_quiz, export_data
+from .archive import open_archive
+from .fuzzy import FUZZY_THRESHOLD
+from .metrics import METRICS
+from .quiz_import import create_quizzes, load_quizzes
+from .user_cache import open_user_cache
+from .watch import MAX_INTERVAL, MIN_INTERVAL, QuizWatcher
 
 
 def _create_quiz(secret):
@@ -36,45 +43,301 @@ def _create_quiz(secret):
     return create_quiz(secret, questions_data)
 
 
-def main():
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--test-mode", action="store_true",
-                        help="use test URLs")
-    args = parser.parse_args()
-
-    SECRET = SecretStuff(args.test_mode)
-    USER_DATA = {}
-
+def _run_menu(args, secret, user_data):
     index = picker(["View user answers", "Grade user answers",
                     "Close current quiz", "Set quiz", "Make new quiz"])[0]
     if index == 0:
-        answers_data = post(
-            "ANSWERS", {"quizNumber": _get_quiz_number()}, SECRET)
-        view_user_answers(USER_DATA, SECRET, answers_data=answers_data)
+        answers_data = fetch_answers(secret, _get_quiz_number())
+        view_user_answers(user_data, secret, answers_data=answers_data)
         if y_to_continue("? Export data?"):
             print()
-            export_data(answers_data, USER_DATA, SECRET)
+            export_data(answers_data, user_data, secret)
         if y_to_continue("? Grade users' answers?"):
-            check_user_answers(USER_DATA, SECRET, answers_data=answers_data)
+            check_user_answers(user_data, secret, answers_data=answers_data)
         if y_to_continue("? Would you like to close the current quiz?"):
-            set_quiz(SECRET, 0)
+            set_quiz(secret, 0)
     elif index == 1:
-        check_user_answers(USER_DATA, SECRET, quiz_number=_get_quiz_number())
+        check_user_answers(user_data, secret, quiz_number=_get_quiz_number())
         if y_to_continue("? Would you like to close the current quiz?"):
-            set_quiz(SECRET, 0)
+            set_quiz(secret, 0)
     elif index == 2:
-        set_quiz(SECRET, 0)
+        set_quiz(secret, 0)
     elif index == 3:
-        set_quiz(SECRET, input("? Input quiz number to set: "))
+        set_quiz(secret, int(input("? Input quiz number to set: ")))
     elif index == 4:
         print("! When you are prompted to provide the questions' answers, if the question has multiple answers, only input one of them.")
-        quiz_number = _create_quiz(SECRET)
+        quiz_number = _create_quiz(secret)
         if y_to_continue("? Would you like to set the quiz to the one just created?"):
-            set_quiz(SECRET, quiz_number)
+            set_quiz(secret, quiz_number)
+    return 0
+
+
+def _run_answers(args, secret, user_data):
+    for answers_data in fetch_quizzes(secret, args.quiz_numbers, user_data, args.workers):
+        view_user_answers(user_data, secret, answers_data=answers_data)
+        print()
+    return 0
+
+
+def _run_grade(args, secret, user_data):
+    # Grading pulls in numpy when it is available, which only this command needs
+    from .grading import DeferredReview, grade_answers, grade_quizzes, load_decisions
+    archive = open_archive() if args.archive else None
+    answers_list = fetch_quizzes(
+        secret, args.quiz_numbers, user_data, args.workers)
+    if args.interactive:
+        # A person answering prompts is the bottleneck here, so grade one quiz after another
+        quiz_scores = []
+        for answers_data in answers_list:
+            print("! Grading quiz #{}".format(answers_data["quizNumber"]))
+            quiz_scores.append(grade_answers(
+                answers_data, user_data, secret, fuzzy_threshold=args.fuzzy, archive=archive)[1])
+        combined = {}
+        for scores in quiz_scores:
+            for user, score in scores.items():
+                combined[user] = combined.get(user, 0) + score
+        reviews = []
+    else:
+        decisions = {}
+        for filename in args.decisions:
+            decisions.update(load_decisions(filename))
+        reviews = [DeferredReview(decisions) for _ in answers_list]
+        combined, quiz_scores = grade_quizzes(
+            answers_list, user_data, secret, reviews, args.fuzzy, args.processes, archive=archive)
+    pending = 0
+    for quiz_num, (answers_data, scores) in enumerate(zip(answers_list, quiz_scores)):
+        quiz_number = answers_data["quizNumber"]
+        print("! Quiz #{}".format(quiz_number))
+        if reviews:
+            review = reviews[quiz_num]
+            os.makedirs(args.review_dir, exist_ok=True)
+            queue_filename = review.write(os.path.join(
+                args.review_dir, "gfmreview-{}.jsonl".format(quiz_number)))
+            if review.pending:
+                print("! {} answers need review; see {}".format(
+                    len(review.pending), queue_filename))
+                pending += len(review.pending)
+        for user, score in sorted(scores.items(), key=lambda item: -item[1]):
+            print("{}\t{}".format(score, user))
+        print()
+    if len(answers_list) > 1:
+        print("! All {} quizzes".format(len(answers_list)))
+        for user, score in sorted(combined.items(), key=lambda item: -item[1]):
+            print("{}\t{}".format(score, user))
+        print()
+    # Let scripts tell "done" apart from "needs a human"
+    return 2 if pending else 0
+
+
+def _describe_event(event):
+    if event["type"] == "quiz":
+        return "! Watching quiz #{}".format(event["quiz_number"])
+    if event["type"] == "answer":
+        return "{} answered \"{}\": {} ({})".format(event["email"], event["question"], event["answer"], "right" if event["correct"] else "wrong")
+    return "    {} now has {} (+{})".format(event["email"], event["score"], event["change"])
+
+
+def _run_watch(args, secret, user_data):
+    watcher = QuizWatcher(secret, user_data, args.fuzzy,
+                          args.min_interval, args.max_interval)
+    try:
+        for events in watcher.watch():
+            for event in events:
+                print(json.dumps(event) if args.json else _describe_event(event), flush=True)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _run_standings(args, secret, user_data):
+    archive = open_archive()
+    for rank, (email, total, played) in enumerate(archive.leaderboard(args.quizzes or None, args.limit), 1):
+        print("{}\t{}\t{}\t({} quizzes)".format(rank, total, email, played))
+    return 0
+
+
+def _run_history(args, secret, user_data):
+    history = open_archive().user_history(args.email)
+    if not history:
+        print("! {} has not played any archived quiz".format(args.email))
+        return 1
+    for quiz_number, score, answered in history:
+        print("#{}\t{}/{}".format(quiz_number, score, answered))
+    print("Total\t{}".format(sum(score for _, score, _ in history)))
+    return 0
+
+
+def _run_accuracy(args, secret, user_data):
+    for quiz_number, question_text, answers, accepted in open_archive().question_accuracy(args.quizzes or None):
+        print("#{}\t{}\t{}/{}\t{}".format(quiz_number, "{:.0%}".format(
+            accepted / answers) if answers else "-", accepted, answers, question_text))
+    return 0
+
+
+def _run_export(args, secret, user_data):
+    for answers_data in fetch_quizzes(secret, args.quiz_numbers, user_data, args.workers):
+        filename = None
+        if args.output_dir is not None:
+            os.makedirs(args.output_dir, exist_ok=True)
+            filename = os.path.join(args.output_dir, "gfmquizresults-{}{}".format(
+                answers_data["quizNumber"], args.format))
+        print(export_data(answers_data, user_data,
+                          secret, filename, args.format))
+    return 0
+
 
+def _run_set(args, secret, user_data):
+    set_quiz(secret, args.quiz_number)
     return 0
 
 
+def _run_close(args, secret, user_data):
+    set_quiz(secret, 0)
+    return 0
+
+
+def _run_create(args, secret, user_data):
+    try:
+        quizzes = load_quizzes(args.from_file, args.questions_per_quiz)
+    except ValueError as e:
+        print("! {}".format(e))
+        return 1
+    quiz_number = None
+    failed = 0
+    for questions_data, result in zip(quizzes, create_quizzes(secret, quizzes, args.workers)):
+        if isinstance(result, Exception):
+            failed += 1
+            print("! Could not create a quiz of {} questions (starting with \"{}\"): {}".format(
+                len(questions_data), questions_data[0]["questionText"], result))
+        else:
+            quiz_number = result
+            print("! Created quiz #{} ({} questions)".format(
+                quiz_number, len(questions_data)))
+    if args.set and quiz_number is not None:
+        set_quiz(secret, quiz_number)
+    return 1 if failed else 0
+
+
+def _fuzzy_threshold(value):
+    threshold = float(value)
+    if not 0 < threshold <= 1:
+        raise argparse.ArgumentTypeError(
+            "must be above 0 and at most 1")
+    return threshold
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--test-mode", action="store_true",
+                        help="use test URLs")
+    parser.add_argument("--no-user-cache", action="store_true",
+                        help="do not read or write the on-disk user cache")
+    parser.add_argument("--answers-max-age", type=float,
+                        help="seconds that cached answers for a live quiz stay fresh")
+    parser.add_argument("--metrics", choices=["json", "prometheus"],
+                        help="print API and user cache metrics to stderr before exiting")
+    parser.add_argument("--workers", type=int, default=QUIZ_FETCH_CONCURRENCY,
+                        help="quizzes to fetch at the same time")
+    parser.set_defaults(func=_run_menu)
+    subparsers = parser.add_subparsers(
+        title="commands", description="leave out to pick from a menu instead")
+
+    quiz_numbers_help = "quiz numbers (leave out for the current quiz)"
+    answers_parser = subparsers.add_parser("answers", help="view users' answers")
+    answers_parser.add_argument("quiz_numbers", nargs="*", type=int, help=quiz_numbers_help)
+    answers_parser.set_defaults(func=_run_answers)
+
+    grade_parser = subparsers.add_parser("grade", help="grade users' answers")
+    grade_parser.add_argument("quiz_numbers", nargs="*", type=int, help=quiz_numbers_help)
+    grade_parser.add_argument("--interactive", action="store_true",
+                              help="ask about every non-matching answer instead of queueing it for review")
+    grade_parser.add_argument("--review-dir", default=RESULTS_FOLDER,
+                              help="folder to write review queues to")
+    grade_parser.add_argument("--decisions", nargs="+", default=[],
+                              help="reviewed queue files to apply")
+    grade_parser.add_argument("--fuzzy", nargs="?", type=_fuzzy_threshold, const=FUZZY_THRESHOLD, metavar="THRESHOLD",
+                              help="accept answers at least THRESHOLD (0-1, default {}) similar to the answer key without review".format(FUZZY_THRESHOLD))
+    grade_parser.add_argument("--processes", type=int,
+                              help="processes to match answers in (default: one per CPU)")
+    grade_parser.add_argument("--archive", action="store_true",
+                              help="store the results in the local archive, for standings")
+    grade_parser.set_defaults(func=_run_grade)
+
+    watch_parser = subparsers.add_parser("watch", help="follow the current quiz's new answers and scores until interrupted")
+    watch_parser.add_argument("--json", action="store_true",
+                              help="print events as JSON lines")
+    watch_parser.add_argument("--fuzzy", nargs="?", type=_fuzzy_threshold, const=FUZZY_THRESHOLD, metavar="THRESHOLD",
+                              help="count answers at least THRESHOLD (0-1, default {}) similar to the answer key as right".format(FUZZY_THRESHOLD))
+    watch_parser.add_argument("--min-interval", type=float, default=MIN_INTERVAL,
+                              help="seconds between polls while answers are coming in")
+    watch_parser.add_argument("--max-interval", type=float, default=MAX_INTERVAL,
+                              help="most seconds between polls while they are not")
+    watch_parser.set_defaults(func=_run_watch)
+
+    archived_help = "archived quiz numbers (leave out for all of them)"
+    standings_parser = subparsers.add_parser("standings", help="show the leaderboard of archived quizzes")
+    standings_parser.add_argument("quizzes", nargs="*", type=int, metavar="quiz_number", help=archived_help)
+    standings_parser.add_argument("--limit", type=int, default=10,
+                                  help="users to show")
+    standings_parser.set_defaults(func=_run_standings)
+
+    history_parser = subparsers.add_parser("history", help="show a user's scores in archived quizzes")
+    history_parser.add_argument("email")
+    history_parser.set_defaults(func=_run_history)
+
+    accuracy_parser = subparsers.add_parser("accuracy", help="show how many answers to each archived question were accepted")
+    accuracy_parser.add_argument("quizzes", nargs="*", type=int, metavar="quiz_number", help=archived_help)
+    accuracy_parser.set_defaults(func=_run_accuracy)
+
+    export_parser = subparsers.add_parser("export", help="export users' answers")
+    export_parser.add_argument("quiz_numbers", nargs="*", type=int, help=quiz_numbers_help)
+    export_parser.add_argument("--format", default=".csv",
+                               help="file extension of the format to write, e.g. .csv.gz or .parquet")
+    export_parser.add_argument("--output-dir",
+                               help="folder to write to instead of the results folder")
+    export_parser.set_defaults(func=_run_export)
+
+    set_parser = subparsers.add_parser("set", help="set the current quiz")
+    set_parser.add_argument("quiz_number", type=int)
+    set_parser.set_defaults(func=_run_set)
+
+    close_parser = subparsers.add_parser("close", help="close the current quiz")
+    close_parser.set_defaults(func=_run_close)
+
+    create_parser = subparsers.add_parser("create", help="create quizzes")
+    create_parser.add_argument("--from-file", nargs="+", required=True,
+                               help="CSV, JSON or YAML files of questions")
+    create_parser.add_argument("--questions-per-quiz", type=int,
+                               help="split questions that a file does not assign to a quiz into quizzes of this many")
+    create_parser.add_argument("--set", action="store_true",
+                               help="set the current quiz to the last one created")
+    create_parser.set_defaults(func=_run_create)
+
+    args = parser.parse_args()
+    if not getattr(args, "quiz_numbers", True):
+        args.quiz_numbers = [None]
+
+    if args.answers_max_age is not None:
+        ANSWERS_CACHE.max_age = args.answers_max_age
+
+    from . import SecretStuff
+    SECRET = SecretStuff(args.test_mode)
+    USER_DATA = {} if args.no_user_cache else open_user_cache(SECRET)
+
+    try:
+        out = args.func(args, SECRET, USER_DATA)
+    finally:
+        if not args.no_user_cache:
+            USER_DATA.close()
+
+    if args.metrics == "json":
+        print(METRICS.to_json(), file=sys.stderr)
+    elif args.metrics == "prometheus":
+        print(METRICS.to_prometheus(), end="", file=sys.stderr)
+
+    return out
+
+
 if __name__ == "__main__":
     sys.exit(main())
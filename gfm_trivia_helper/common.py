@@ -1,12 +1,14 @@
-import csv
 import json
 import logging
-import operator
 import os
-from time import sleep
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
 
-import requests
-import zmtools
+from .metrics import METRICS
+from .response_cache import ResponseCache
+from .throttling import SingleFlight, TokenBucket
 
 LOGGER = logging.getLogger(__name__)
 
@@ -15,21 +17,169 @@ QUESTION_TYPES = {
     1: "OR"
 }
 
+USER_LOOKUP_CONCURRENCY = 8
+QUIZ_FETCH_CONCURRENCY = 4
 
-def post(url_type, payload, secret):
+POOL_SIZE = 16
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+RETRIES = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Endpoints that must not be sent twice, so they are only retried if the first attempt never reached the server (or it turned the request away with a 429)
+UNRETRIED_ENDPOINTS = {"CREATE_QUIZ"}
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10
+
+# Requests a second, and the largest burst, allowed to each endpoint; endpoints not listed are not limited
+RATE_LIMITS = {"ANSWERS": (5, 10), "USER": (50, 100)}
+# Endpoints that only read, so identical requests in flight at the same time can share a response
+COALESCED_ENDPOINTS = {"ANSWERS", "USER"}
+
+STREAM_CHUNK_SIZE = 500
+
+_JSON_CONTAINER_STARTS = ("[", "{", "\"")
+
+RESULTS_FOLDER = os.path.join(os.path.expanduser("~"), "quiz_results", "gfm")
+
+# Set to None to always fetch answers from the site
+ANSWERS_CACHE = ResponseCache(os.path.join(RESULTS_FOLDER, "responses"))
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+_RATE_LIMITERS = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+_IN_FLIGHT = SingleFlight()
+
+
+def _get_session():
+    '''
+    Return the shared session, creating it on first use
+    '''
+    global _SESSION
+    # requests is slow to import, so only pay for it once something is sent
+    import requests
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _SESSION.mount("https://", adapter)
+            _SESSION.mount("http://", adapter)
+        return _SESSION
+
+
+def _throttle(url_type):
+    '''
+    Wait until another request to an endpoint is allowed by RATE_LIMITS
+    '''
+    limit = RATE_LIMITS.get(url_type)
+    if limit is None:
+        return
+    with _RATE_LIMITERS_LOCK:
+        limiter = _RATE_LIMITERS.get(url_type)
+        # A changed limit gets a fresh bucket
+        if limiter is None or (limiter.rate, limiter.capacity) != tuple(limit):
+            limiter = _RATE_LIMITERS[url_type] = TokenBucket(*limit)
+    waited = limiter.acquire()
+    if waited:
+        METRICS.record_throttle(url_type, waited)
+
+
+def _backoff(attempt_num):
+    '''
+    Sleep for an exponentially growing, jittered amount of time
+    '''
+    sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt_num)))
+
+
+def _request_size(response):
+    body = response.request.body
+    return len(body) if body else 0
+
+
+def post(url_type, payload, secret, timeout=None, retries=RETRIES, stream=False):
+    '''
+    Do a post request with a secure payload. timeout is a (connect, read) tuple of seconds. If stream is True, return the unread response instead of its JSON. Identical requests to COALESCED_ENDPOINTS made while one is in flight wait for it and return the same object, so do not modify what is returned
     '''
-    Do a post request with a secure payload
+    if stream or url_type not in COALESCED_ENDPOINTS:
+        return _post(url_type, payload, secret, timeout, retries, stream)
+    # Keyed by URL too, so that different sites (such as test mode and live) never share responses
+    key = (url_type, secret.urls[url_type],
+           json.dumps(payload, sort_keys=True))
+    out, shared = _IN_FLIGHT.do(
+        key, lambda: _post(url_type, payload, secret, timeout, retries))
+    if shared:
+        METRICS.record_coalesced(url_type)
+        LOGGER.debug("{} request shared with one in flight".format(url_type))
+    return out
+
+
+def _not_sent(e):
+    '''
+    Return True if a requests exception happened before the request could be sent
     '''
-    attempt_num = 0
-    for attempt_num in range(3):
+    import requests
+    from urllib3.exceptions import ConnectTimeoutError
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    # Refused connections and failed name lookups are wrapped, and derive from ConnectTimeoutError
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def _post(url_type, payload, secret, timeout=None, retries=RETRIES, stream=False):
+    import requests
+    retryable = url_type not in UNRETRIED_ENDPOINTS
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    for attempt_num in range(retries):
+        if attempt_num:
+            METRICS.record_retry(url_type)
+        last_attempt = attempt_num == retries - 1
+        _throttle(url_type)
+        start = perf_counter()
         try:
-            out = requests.post(
-                secret.urls[url_type], json=secret.secure_payload(payload)).json()
-            LOGGER.debug(out)
-            return out
-        except json.decoder.JSONDecodeError:
-            sleep(2)
-            attempt_num += 1
+            response = _get_session().post(
+                secret.urls[url_type], json=secret.secure_payload(payload), timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            METRICS.record_request(
+                url_type, perf_counter() - start, error=True)
+            LOGGER.debug("{} request failed: {}".format(url_type, e))
+            if last_attempt or not (retryable or _not_sent(e)):
+                raise
+            _backoff(attempt_num)
+            continue
+        if stream:
+            # The body has not been read yet, so go by what the server says it will be
+            METRICS.record_request(url_type, perf_counter() - start, _request_size(
+                response), int(response.headers.get("Content-Length", 0)), not response.ok)
+        else:
+            METRICS.record_request(url_type, perf_counter() - start, _request_size(
+                response), len(response.content), not response.ok)
+        if response.status_code in RETRY_STATUSES and not last_attempt and (retryable or response.status_code == 429):
+            LOGGER.debug("{} request returned {}".format(
+                url_type, response.status_code))
+            if stream:
+                # The body was never read, so hand its connection back to the pool now
+                response.close()
+            _backoff(attempt_num)
+            continue
+        if stream:
+            if not response.ok:
+                response.close()
+            response.raise_for_status()
+            return response
+        try:
+            out = response.json()
+        except ValueError:
+            if last_attempt or not retryable:
+                break
+            _backoff(attempt_num)
+            continue
+        LOGGER.debug("{} response: {} bytes in {:.3f}s".format(
+            url_type, len(response.content), response.elapsed.total_seconds()))
+        return out
     raise ValueError("Response was not JSON")
 
 
@@ -50,33 +200,338 @@ def _get_user_data(user_data, user_id, secret):
     try:
         out = user_data[user_id]
     except KeyError:
+        METRICS.record_user_lookups(misses=(user_id,))
         out = post("USER", {"id": user_id}, secret)
         user_data[user_id] = out
+    else:
+        METRICS.record_user_lookups(hits=(user_id,))
     return out
 
 
-def _compare_answer(user_answer, actual_answer):
+class AnswerStream:
     '''
-    Return False if the user's answer is not obviously the correct answer
+    An ANSWERS response that is parsed incrementally and iterated as (question, answer) records. Requires ijson; without it, the response is parsed in one go
+    '''
+
+    def __init__(self, secret, quiz_number=None):
+        self.secret = secret
+        self.quiz_number = quiz_number
+
+    def __iter__(self):
+        response = post("ANSWERS", {"quizNumber": self.quiz_number},
+                        self.secret, stream=True)
+        try:
+            import ijson
+        except ImportError:
+            ijson = None
+        with response:
+            if ijson is None:
+                LOGGER.debug("ijson is not installed; not streaming")
+                answers_data = response.json()
+                self.quiz_number = answers_data["quizNumber"]
+                yield from _iter_answer_records(answers_data)
+                return
+            response.raw.decode_content = True
+            yield from self._iter_events(ijson, ijson.parse(response.raw, use_float=True))
+
+    def _iter_events(self, ijson, events):
+        question = None
+        for prefix, event, value in events:
+            if prefix == "quizNumber":
+                self.quiz_number = value
+            elif prefix == "questions.item":
+                if event == "start_map":
+                    question = {}
+                    pending = []
+                    answered = False
+                elif event == "end_map":
+                    for answer in pending:
+                        yield question, answer
+                    if not answered:
+                        yield question, None
+                    question = None
+                elif event == "map_key" and value != "userAnswers":
+                    key = value
+                    builder = ijson.ObjectBuilder()
+                    depth = 0
+            elif question is None:
+                continue
+            elif prefix.startswith("questions.item.userAnswers."):
+                if prefix == "questions.item.userAnswers.item" and event == "start_map":
+                    answer_builder = ijson.ObjectBuilder()
+                answer_builder.event(event, value)
+                if prefix == "questions.item.userAnswers.item" and event == "end_map":
+                    answered = True
+                    # Hold answers back until the question they belong to is complete
+                    if pending or "questionText" not in question or "questionAnswer" not in question:
+                        pending.append(answer_builder.value)
+                    else:
+                        yield question, answer_builder.value
+            elif prefix.startswith("questions.item.") and prefix != "questions.item.userAnswers":
+                builder.event(event, value)
+                if event in ("start_map", "start_array"):
+                    depth += 1
+                elif event in ("end_map", "end_array"):
+                    depth -= 1
+                if depth == 0 and event != "map_key":
+                    question[key] = builder.value
+
+
+def _iter_answer_records(answers_data):
+    '''
+    Yield (question, answer) records from answers data, which is either an ANSWERS payload or an iterable of records. Questions with no answers are yielded once with an answer of None
+    '''
+    if not isinstance(answers_data, dict):
+        yield from answers_data
+        return
+    for question in answers_data["questions"]:
+        if not question["userAnswers"]:
+            yield question, None
+        for answer in question["userAnswers"]:
+            yield question, answer
+
+
+def _get_answers_quiz_number(answers_data):
+    '''
+    Return the quiz number of answers data, or None if it is not known (yet)
+    '''
+    if isinstance(answers_data, dict):
+        return answers_data["quizNumber"]
+    return getattr(answers_data, "quiz_number", None)
+
+
+def _append_answer_id(answer_ids, answer_id):
+    '''
+    Append to an array("q") of answer IDs, which becomes a list once an ID is not an integer it can hold (the API may hand IDs back as strings). Return what was appended to
     '''
-    s = [s.upper() for s in actual_answer["answer"]]
     try:
-        modified_answer = json.loads(user_answer)
-        if isinstance(modified_answer, list):
-            modified_answer = [s.strip().upper() for s in modified_answer]
+        answer_ids.append(answer_id)
+    except (TypeError, OverflowError):
+        answer_ids = list(answer_ids)
+        answer_ids.append(answer_id)
+    return answer_ids
+
+
+def _iter_user_ids(records):
+    '''
+    Yield each distinct user ID found in (question, answer) records, in order of first appearance
+    '''
+    seen = set()
+    for _, answer in records:
+        if answer is None:
+            continue
+        user_id = answer["userID"]
+        if user_id not in seen:
+            seen.add(user_id)
+            yield user_id
+
+
+def prefetch_user_data(user_data, answers_data, secret, max_workers=USER_LOOKUP_CONCURRENCY):
+    '''
+    Look up every user in answers data that is not yet in the user_data dict, using up to max_workers concurrent requests
+    '''
+    return prefetch_users(user_data, _iter_user_ids(_iter_answer_records(answers_data)), secret, max_workers)
+
+
+def prefetch_users(user_data, user_ids, secret, max_workers=USER_LOOKUP_CONCURRENCY):
+    '''
+    Look up every one of user_ids that is not yet in the user_data dict, using up to max_workers concurrent requests
+    '''
+    user_ids = list(user_ids)
+    missing = [user_id for user_id in user_ids if user_id not in user_data]
+    missing_set = set(missing)
+    METRICS.record_user_lookups(
+        (user_id for user_id in user_ids if user_id not in missing_set), missing)
+    if not missing:
+        return user_data
+    LOGGER.debug("Prefetching {} users".format(len(missing)))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as executor:
+        results = executor.map(lambda user_id: post(
+            "USER", {"id": user_id}, secret), missing)
+        fetched = {}
+        try:
+            for user_id, result in zip(missing, results):
+                fetched[user_id] = result
+        finally:
+            # Only the calling thread writes to user_data, and all at once (a single transaction for a user_cache.UserCache), keeping whatever was fetched before a failure
+            user_data.update(fetched)
+    return user_data
+
+
+def resolve_emails(user_data, user_ids, secret):
+    '''
+    Look up every one of user_ids at once, like prefetch_users, and return a dict of each one's email
+    '''
+    user_ids = list(user_ids)
+    prefetch_users(user_data, user_ids, secret)
+    emails = {}
+    for user_id in user_ids:
+        try:
+            user = user_data[user_id]
+        except KeyError:
+            # Expired from the user cache since the prefetch
+            user = _get_user_data(user_data, user_id, secret)
+        emails[user_id] = user["email"]
+    return emails
+
+
+def _iter_records_with_users(answers_data, user_data, secret, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Yield (question, answer) records from answers data once their users are in user_data. Payloads are prefetched in full; streams are prefetched a chunk at a time
+    '''
+    if isinstance(answers_data, dict):
+        prefetch_user_data(user_data, answers_data, secret)
+        yield from _iter_answer_records(answers_data)
+        return
+    chunk = []
+    # Users in several chunks are only looked up (and counted) once
+    seen = set()
+
+    def prefetch_chunk():
+        user_ids = [user_id for user_id in _iter_user_ids(
+            chunk) if user_id not in seen]
+        seen.update(user_ids)
+        prefetch_users(user_data, user_ids, secret)
+
+    for record in answers_data:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            prefetch_chunk()
+            yield from chunk
+            chunk = []
+    prefetch_chunk()
+    yield from chunk
+
+
+def _iter_records_with_emails(answers_data, user_data, secret):
+    '''
+    Yield (question, answer, email) records from answers data, looking each user's email up once. The email is None for questions without answers
+    '''
+    if hasattr(answers_data, "iter_records_with_emails"):
+        # A model.QuizAnswers, which keeps its users' emails itself
+        yield from answers_data.iter_records_with_emails(user_data, secret)
+        return
+    emails = {}
+    for question, answer in _iter_records_with_users(answers_data, user_data, secret):
+        if answer is None:
+            yield question, None, None
+            continue
+        user_id = answer["userID"]
+        email = emails.get(user_id)
+        if email is None:
+            email = emails[user_id] = _get_user_data(
+                user_data, user_id, secret)["email"]
+        yield question, answer, email
+
+
+def _get_answers(secret, answers_data=None, quiz_number=None, stream=False):
+    '''
+    Return answers_data, or fetch (or stream) the answers for quiz_number if it is None
+    '''
+    if answers_data is not None and quiz_number is not None:
+        raise ValueError("Cannot specify both answers_data and quiz_number")
+    if answers_data is not None:
+        return answers_data
+    if stream:
+        return AnswerStream(secret, quiz_number)
+    return fetch_answers(secret, quiz_number)
+
+
+def fetch_answers(secret, quiz_number=None, max_age=None):
+    '''
+    Get a quiz's answers, reading through the site's part of ANSWERS_CACHE. A quiz other than the current one is only cached as closed once the current quiz has been fetched afresh and is a different one
+    '''
+    payload = {"quizNumber": quiz_number}
+    if ANSWERS_CACHE is None:
+        return post("ANSWERS", payload, secret)
+    cache = ANSWERS_CACHE.for_site(secret.urls["ANSWERS"])
+    answers_data = cache.get("ANSWERS", payload, max_age)
+    if answers_data is not None:
+        LOGGER.debug("Using cached answers for quiz {}".format(quiz_number))
+        return answers_data
+    # Asked first, as the quiz may otherwise be closed while its answers are on their way
+    current_data = post("ANSWERS", {"quizNumber": None}, secret)
+    # Before storing anything, as a change of quiz drops what was cached for the old one
+    cache.set_current_quiz(current_data["quizNumber"])
+    # The current quiz, which is also worth caching by its number
+    cache.put("ANSWERS", {"quizNumber": None}, current_data)
+    cache.put(
+        "ANSWERS", {"quizNumber": current_data["quizNumber"]}, current_data)
+    if quiz_number is None or quiz_number == current_data["quizNumber"]:
+        return current_data
+    answers_data = post("ANSWERS", payload, secret)
+    cache.put("ANSWERS", payload, answers_data, closed=True)
+    return answers_data
+
+
+def fetch_quizzes(secret, quiz_numbers, user_data=None, max_workers=QUIZ_FETCH_CONCURRENCY):
+    '''
+    Fetch several quizzes' answers, up to max_workers at a time, and return them in the same order as quiz_numbers. If user_data is given, every user in any of them is then looked up in one go
+    '''
+    quiz_numbers = list(quiz_numbers)
+    if not quiz_numbers:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(quiz_numbers)))) as executor:
+        answers_list = list(executor.map(
+            lambda quiz_number: fetch_answers(secret, quiz_number), quiz_numbers))
+    if user_data is not None:
+        # After the fetches, so that users in several quizzes are looked up once
+        prefetch_users(user_data, _iter_user_ids(
+            record for answers_data in answers_list for record in _iter_answer_records(answers_data)), secret)
+    return answers_list
+
+
+def _normalize_answer(user_answer):
+    '''
+    Split a user's answer into upper-cased parts the same way the site's answer format allows: a JSON list, a comma-separated list, or a single answer
+    '''
+    # Only these can be JSON that is not just the answer itself; anything else would be treated as a single answer or split on commas either way
+    if user_answer.lstrip(" \t\n\r")[:1] in _JSON_CONTAINER_STARTS:
+        try:
+            modified_answer = json.loads(user_answer)
+        except json.decoder.JSONDecodeError:
+            pass
         else:
-            # No good
-            modified_answer = [user_answer.upper()]
-    except json.decoder.JSONDecodeError:
-        # No good
-        modified_answer = [s.strip().upper() for s in user_answer.split(",")]
-        if len(modified_answer) == 1:
-            # No good
-            modified_answer = [user_answer.upper()]
-    if actual_answer["type"] == 0:
-        return modified_answer == s
-    elif actual_answer["type"] == 1:
-        return (all(x in s for x in modified_answer))
+            if isinstance(modified_answer, list):
+                return [s.strip().upper() for s in modified_answer]
+            return [user_answer.upper()]
+    if "," not in user_answer:
+        return [user_answer.upper()]
+    return [s.strip().upper() for s in user_answer.split(",")]
+
+
+class AnswerMatcher:
+    '''
+    A question's answer key, normalized once so many users' answers can be checked against it
+    '''
+
+    __slots__ = ("type", "key", "key_set")
+
+    def __init__(self, actual_answer):
+        self.type = actual_answer["type"]
+        self.key = [s.upper() for s in actual_answer["answer"]]
+        self.key_set = frozenset(self.key)
+
+    def match(self, user_answer):
+        '''
+        Return False if the user's answer is not obviously the correct answer
+        '''
+        modified_answer = _normalize_answer(user_answer)
+        if self.type == 0:
+            return modified_answer == self.key
+        elif self.type == 1:
+            key_set = self.key_set
+            for x in modified_answer:
+                if x not in key_set:
+                    return False
+            return True
+
+
+def _compare_answer(user_answer, actual_answer):
+    '''
+    Return False if the user's answer is not obviously the correct answer
+    '''
+    return AnswerMatcher(actual_answer).match(user_answer)
 
 
 def y_to_continue(prompt="? Enter y to continue:"):
@@ -101,75 +556,55 @@ def create_quiz(secret, questions_data):
     return post("CREATE_QUIZ", {"questions": questions_data}, secret)["quizNumber"]
 
 
-def view_user_answers(user_data, secret, answers_data=None, quiz_number=None):
+def view_user_answers(user_data, secret, answers_data=None, quiz_number=None, stream=False):
     '''
     View users' answers
     '''
-    if answers_data is not None and quiz_number is not None:
-        raise ValueError("Cannot specify both answers_data and quiz_number")
-    if answers_data is None:
-        answers_data = post("ANSWERS", {"quizNumber": quiz_number}, secret)
-    print("Viewing data for quiz #{}".format(answers_data["quizNumber"]))
-    for question in answers_data["questions"]:
-        print()
-        print("! Question: {}".format(question["questionText"]))
-        print("! Answer(s): {} ({})".format(
-            question["questionAnswer"]["answer"], QUESTION_TYPES[question["questionAnswer"]["type"]]))
-        print("----")
-        for answer in question["userAnswers"]:
-            print("! {} answered: {}".format(_get_user_data(user_data,
-                                                            answer["userID"], secret)["email"], answer["answerText"]))
+    answers_data = _get_answers(secret, answers_data, quiz_number, stream)
+    current_question = None
+    for question, answer, email in _iter_records_with_emails(answers_data, user_data, secret):
+        if current_question is None:
+            # Printed late so that a stream has seen its quiz number
+            print("Viewing data for quiz #{}".format(
+                _get_answers_quiz_number(answers_data)))
+        if question is not current_question:
+            current_question = question
+            print()
+            print("! Question: {}".format(question["questionText"]))
+            print("! Answer(s): {} ({})".format(
+                question["questionAnswer"]["answer"], QUESTION_TYPES[question["questionAnswer"]["type"]]))
+            print("----")
+        if answer is not None:
+            print("! {} answered: {}".format(email, answer["answerText"]))
+    if current_question is None:
+        print("Viewing data for quiz #{}".format(
+            _get_answers_quiz_number(answers_data)))
 
 
-def export_data(answers_data, user_data, secret):
+def export_data(answers_data, user_data, secret, filename=None, extension=".csv"):
     '''
-    Export answers data to a CSV and return the filename
+    Export answers data (a payload or a stream) and return the filename. Writes a CSV to the results folder unless told otherwise; see export.EXPORTERS for the other formats
     '''
-    folder = os.path.join(os.path.expanduser("~"), "quiz_results", "gfm")
-    os.makedirs(folder, exist_ok=True)
-    filename = os.path.join(
-        folder, "gfmquizresults-{}.csv".format(answers_data["quizNumber"]))
-    with open(filename, "w", newline="") as csvfile:
-        fieldnames = ["user", "question", "answer", "answer_id"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for question in answers_data["questions"]:
-            for answer in question["userAnswers"]:
-                writer.writerow({"user": _get_user_data(user_data, answer["userID"], secret)[
-                                "email"], "question": question["questionText"], "answer": answer["answerText"], "answer_id": answer["answerID"]})
-    return filename
+    # Imported here because export builds on this module
+    from .export import export_answers
+    return export_answers(answers_data, user_data, secret, filename, extension)
 
 
 def set_quiz(secret, quiz_number):
     '''
     Set the site's current quiz number
     '''
-    return post("SET_QUIZ", {"quizNumber": quiz_number}, secret)
+    out = post("SET_QUIZ", {"quizNumber": quiz_number}, secret)
+    if ANSWERS_CACHE is not None:
+        ANSWERS_CACHE.for_site(secret.urls["ANSWERS"]).set_current_quiz(
+            int(quiz_number) or None)
+    return out
 
 
-def check_user_answers(user_data, secret, answers_data=None, quiz_number=None):
+def check_user_answers(user_data, secret, answers_data=None, quiz_number=None, stream=False, fuzzy_threshold=None):
     '''
-    Grade a user's answers and return the highest's scoring user and the rest of the scores
+    Grade a user's answers and return the highest's scoring user and the rest of the scores. With a fuzzy_threshold (such as fuzzy.FUZZY_THRESHOLD), near misses of the answer key are accepted without asking
     '''
-    if answers_data is not None and quiz_number is not None:
-        raise ValueError("Cannot specify both answers_data and quiz_number")
-    if answers_data is None:
-        answers_data = post("ANSWERS", {"quizNumber": quiz_number}, secret)
-    scores = {}
-    for question in answers_data["questions"]:
-        for answer in question["userAnswers"]:
-            user = _get_user_data(user_data, answer["userID"], secret)["email"]
-            if answer["answerText"] == "":
-                # Left blank means efinitely wrong
-                continue
-            match = _compare_answer(
-                answer["answerText"], question["questionAnswer"])
-            if not match:
-                print("! {} answered with non-matching answer for question \"{}\".\n    User answer: {}\n    Actual answer: {} ({})".format(_get_user_data(user_data, answer["userID"], secret)[
-                      "email"], question["questionText"], answer["answerText"], question["questionAnswer"]["answer"], QUESTION_TYPES[question["questionAnswer"]["type"]]))
-            if match or y_to_continue("? Accept answer?"):
-                scores[user] = scores.get(user, 0) + 1
-    highest_score_user = max(scores.items(), key=operator.itemgetter(1))[0]
-    print("! The user with the highest score is {} (score: {}). You may want to notify them that they won something!".format(
-        highest_score_user, scores[highest_score_user]))
-    return highest_score_user, scores
+    # Imported here because grading builds on this module
+    from .grading import grade_answers
+    return grade_answers(_get_answers(secret, answers_data, quiz_number, stream), user_data, secret, fuzzy_threshold=fuzzy_threshold)
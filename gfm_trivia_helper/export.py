@@ -0,0 +1,165 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import logging
+import os
+
+from .common import (RESULTS_FOLDER, _get_answers_quiz_number,
+                     _iter_records_with_emails)
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LOGGER = logging.getLogger(__name__)
+
+FIELDNAMES = ("user", "question", "answer", "answer_id")
+CHUNK_SIZE = 10000
+BUFFER_SIZE = 1024 * 1024
+
+
+def _iter_rows(answers_data, user_data, secret):
+    '''
+    Yield (user, question, answer, answer_id) tuples from answers data
+    '''
+    for question, answer, email in _iter_records_with_emails(answers_data, user_data, secret):
+        if answer is not None:
+            yield (email, question["questionText"], answer["answerText"], answer["answerID"])
+
+
+def _iter_chunks(rows, chunk_size=CHUNK_SIZE):
+    '''
+    Yield lists of up to chunk_size rows
+    '''
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _to_columns(chunk):
+    return dict(zip(FIELDNAMES, (list(column) for column in zip(*chunk)))) if chunk else {field: [] for field in FIELDNAMES}
+
+
+def _write_csv_to(f, rows):
+    writer = csv.writer(f)
+    writer.writerow(FIELDNAMES)
+    for chunk in _iter_chunks(rows):
+        writer.writerows(chunk)
+
+
+def write_csv(filename, rows):
+    with open(filename, "w", newline="", buffering=BUFFER_SIZE) as f:
+        _write_csv_to(f, rows)
+
+
+def write_csv_gzip(filename, rows):
+    with gzip.open(filename, "wt", newline="", compresslevel=6) as f:
+        _write_csv_to(f, rows)
+
+
+def write_csv_zstd(filename, rows):
+    if zstandard is None:
+        raise ValueError(
+            "zstandard is required for .csv.zst exports; install it or use .csv.gz")
+    with open(filename, "wb") as raw, zstandard.ZstdCompressor().stream_writer(raw) as compressed:
+        with io.TextIOWrapper(compressed, newline="", write_through=True) as f:
+            _write_csv_to(f, rows)
+
+
+def _arrow_batches(rows):
+    schema = pyarrow.schema([("user", pyarrow.string()), ("question", pyarrow.string()),
+                             ("answer", pyarrow.string()), ("answer_id", pyarrow.int64())])
+    for chunk in _iter_chunks(rows):
+        yield pyarrow.RecordBatch.from_pydict(_to_columns(chunk), schema=schema)
+
+
+def write_parquet(filename, rows):
+    if pyarrow is None:
+        raise ValueError(
+            "pyarrow is required for .parquet exports; install it or use .cols.jsonl.gz")
+    batches = _arrow_batches(rows)
+    first = next(batches, None)
+    if first is None:
+        first = pyarrow.RecordBatch.from_pydict(_to_columns([]))
+    with pyarrow.parquet.ParquetWriter(filename, first.schema, compression="zstd") as writer:
+        for batch in itertools.chain([first], batches):
+            writer.write_batch(batch)
+
+
+def write_arrow(filename, rows):
+    if pyarrow is None:
+        raise ValueError(
+            "pyarrow is required for .arrow exports; install it or use .cols.jsonl.gz")
+    batches = _arrow_batches(rows)
+    first = next(batches, None)
+    if first is None:
+        first = pyarrow.RecordBatch.from_pydict(_to_columns([]))
+    with pyarrow.ipc.new_file(filename, first.schema) as writer:
+        for batch in itertools.chain([first], batches):
+            writer.write_batch(batch)
+
+
+def write_columns(filename, rows):
+    '''
+    Write gzipped JSON Lines, one line of columns per chunk of rows. Needs no third-party libraries
+    '''
+    with gzip.open(filename, "wt", compresslevel=6) as f:
+        for chunk in _iter_chunks(rows):
+            f.write(json.dumps(_to_columns(chunk), separators=(",", ":")))
+            f.write("\n")
+
+
+# Longest extensions first so that ".csv.gz" wins over ".gz"
+EXPORTERS = {
+    ".cols.jsonl.gz": write_columns,
+    ".csv.gz": write_csv_gzip,
+    ".csv.zst": write_csv_zstd,
+    ".parquet": write_parquet,
+    ".arrow": write_arrow,
+    ".csv": write_csv
+}
+
+
+def get_exporter(filename):
+    '''
+    Return the function that writes filename's format
+    '''
+    for extension, exporter in EXPORTERS.items():
+        if filename.endswith(extension):
+            return exporter
+    raise ValueError("Unknown export format for {}; use one of {}".format(
+        filename, ", ".join(EXPORTERS)))
+
+
+def export_answers(answers_data, user_data, secret, filename=None, extension=".csv"):
+    '''
+    Export answers data (a payload or a stream) to filename, in the format its extension names, and return the filename. If filename is not given, write to the results folder with the given extension
+    '''
+    if filename is not None:
+        exporter = get_exporter(filename)
+    else:
+        exporter = get_exporter(extension)
+    rows = _iter_rows(answers_data, user_data, secret)
+    # Pull the first row so a stream has seen its quiz number
+    first = next(rows, None)
+    if first is not None:
+        rows = itertools.chain([first], rows)
+    if filename is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        filename = os.path.join(RESULTS_FOLDER, "gfmquizresults-{}{}".format(
+            _get_answers_quiz_number(answers_data), extension))
+    LOGGER.debug("Exporting to {}".format(filename))
+    exporter(filename, rows)
+    return filename
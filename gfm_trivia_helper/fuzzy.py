@@ -0,0 +1,145 @@
+import logging
+
+from .common import _normalize_answer
+
+LOGGER = logging.getLogger(__name__)
+
+# How similar (1 - edits / length of the longer text) a near miss must be to the answer key to be accepted
+FUZZY_THRESHOLD = 0.85
+# Parts shorter than this are too easy to confuse ("CAT" and "CAR") and must match exactly
+FUZZY_MIN_LENGTH = 4
+
+
+def edit_distance(a, b, max_distance=None):
+    '''
+    Return the Levenshtein distance between a and b, or something larger than max_distance as soon as it must exceed it
+    '''
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    '''
+    Words indexed by edit distance, so the words near a query can be found without measuring the distance to all of them
+    '''
+
+    __slots__ = ("root",)
+
+    def __init__(self, words=()):
+        # Nodes are (word, {distance: child node})
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        '''
+        Return (distance, word) for every word within max_distance edits of word
+        '''
+        found = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node_word, children = nodes.pop()
+            distance = edit_distance(word, node_word)
+            if distance <= max_distance:
+                found.append((distance, node_word))
+            # Only children this far from their parent can be close enough to word
+            for child_distance in range(distance - max_distance, distance + max_distance + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    nodes.append(child)
+        return found
+
+
+def _squash(text):
+    return " ".join(text.split())
+
+
+def _digits(text):
+    return "".join(char for char in text if char.isdigit())
+
+
+class FuzzyMatcher:
+    '''
+    Accepts near misses of an AnswerMatcher's key: each part of an answer must be at least threshold similar to its part of the key (for AND questions) or to any part of it (for OR questions). Numbers in a part must match exactly. Results are cached per normalized answer, so variants of one answer are only compared once
+    '''
+
+    __slots__ = ("matcher", "threshold", "min_length", "key_parts", "tree", "_cache")
+
+    def __init__(self, matcher, threshold=FUZZY_THRESHOLD, min_length=FUZZY_MIN_LENGTH):
+        if not 0 < threshold <= 1:
+            raise ValueError("Fuzzy threshold must be above 0 and at most 1")
+        self.matcher = matcher
+        self.threshold = threshold
+        self.min_length = min_length
+        self.key_parts = frozenset(_squash(part) for part in matcher.key)
+        self.tree = BKTree(self.key_parts)
+        self._cache = {}
+
+    def _is_near(self, part, key_part, distance):
+        return distance <= (1 - self.threshold) * max(len(part), len(key_part)) and _digits(part) == _digits(key_part)
+
+    def _near_key_part(self, part, key_part):
+        part = _squash(part)
+        key_part = _squash(key_part)
+        if part == key_part:
+            return True
+        if len(part) < self.min_length:
+            return False
+        limit = int((1 - self.threshold) * max(len(part), len(key_part)))
+        return self._is_near(part, key_part, edit_distance(part, key_part, limit))
+
+    def _near_any_key_part(self, part):
+        part = _squash(part)
+        if part in self.key_parts:
+            return True
+        if len(part) < self.min_length:
+            return False
+        # A key part of length k within d edits has k <= len(part) + d, so this bounds d
+        limit = int((1 - self.threshold) * len(part) / self.threshold)
+        return any(self._is_near(part, key_part, distance) for distance, key_part in self.tree.search(part, limit))
+
+    def match(self, user_answer):
+        '''
+        Return True if the user's answer is close enough to the key to accept without asking
+        '''
+        try:
+            parts = tuple(_normalize_answer(user_answer))
+        except AttributeError:
+            # A JSON list of things that are not strings
+            return False
+        result = self._cache.get(parts)
+        if result is None:
+            if self.matcher.type == 0:
+                result = len(parts) == len(self.matcher.key) and all(self._near_key_part(
+                    part, key_part) for part, key_part in zip(parts, self.matcher.key))
+            else:
+                result = all(self._near_any_key_part(part) for part in parts)
+            self._cache[parts] = result
+        return result
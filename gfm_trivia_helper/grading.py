@@ -0,0 +1,544 @@
+import itertools
+import json
+import logging
+import operator
+import os
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from .common import (QUESTION_TYPES, RESULTS_FOLDER, AnswerMatcher,
+                     _append_answer_id, _get_answers,
+                     _get_answers_quiz_number,
+                     _iter_answer_records, _iter_records_with_emails,
+                     _iter_user_ids, _normalize_answer, resolve_emails,
+                     y_to_continue)
+from .fuzzy import FuzzyMatcher
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LOGGER = logging.getLogger(__name__)
+
+CHECKPOINT_FOLDER = os.path.join(RESULTS_FOLDER, "checkpoints")
+BATCH_SIZE = 500
+# Answers in each chunk of whole questions that grade_quizzes hands to a worker process
+PROCESS_CHUNK_SIZE = 20000
+
+BLANK = -1
+MISMATCH = 0
+MATCH = 1
+
+
+class QuizColumns:
+    '''
+    A quiz's answers laid out as columns: one entry per answer in user_col and answer_col, indexing into users and distinct_answers respectively, and each answer's ID in answer_ids (a list rather than an array if any ID is not an integer)
+    '''
+
+    __slots__ = ("quiz_number", "questions", "matchers", "users", "distinct_answers",
+                 "user_col", "answer_col", "answer_ids", "_user_index", "_answer_index")
+
+    def __init__(self):
+        self.quiz_number = None
+        self.questions = []
+        self.matchers = []
+        self.users = []
+        self.distinct_answers = []
+        self.user_col = array("l")
+        self.answer_col = array("l")
+        self.answer_ids = array("q")
+        self._user_index = {}
+        self._answer_index = {}
+
+    @classmethod
+    def from_answers(cls, answers_data, user_data, secret):
+        '''
+        Build columns from answers data (a payload or a stream of records)
+        '''
+        columns = cls()
+        columns.extend(_iter_records_with_emails(
+            answers_data, user_data, secret))
+        columns.quiz_number = _get_answers_quiz_number(answers_data)
+        return columns
+
+    def extend(self, records):
+        '''
+        Add (question, answer, email) records that carry on from the ones added so far
+        '''
+        user_index = self._user_index
+        answer_index = self._answer_index
+        current_question = self.questions[-1] if self.questions else None
+        question_num = len(self.questions) - 1
+        for question, answer, email in records:
+            if question is not current_question:
+                current_question = question
+                self.questions.append(question)
+                self.matchers.append(AnswerMatcher(question["questionAnswer"]))
+                question_num = len(self.questions) - 1
+            if answer is None:
+                continue
+            user_num = user_index.get(email)
+            if user_num is None:
+                user_num = user_index[email] = len(self.users)
+                self.users.append(email)
+            key = (question_num, answer["answerText"])
+            answer_num = answer_index.get(key)
+            if answer_num is None:
+                answer_num = answer_index[key] = len(self.distinct_answers)
+                self.distinct_answers.append(key)
+            self.user_col.append(user_num)
+            self.answer_col.append(answer_num)
+            self.answer_ids = _append_answer_id(
+                self.answer_ids, answer["answerID"])
+
+    @classmethod
+    def concat(cls, parts):
+        '''
+        Join the columns of consecutive chunks of one quiz, each built from different questions, into the columns from_answers would have built for the whole quiz
+        '''
+        columns = cls()
+        user_index = {}
+        for part in parts:
+            if columns.quiz_number is None:
+                columns.quiz_number = part.quiz_number
+            question_offset = len(columns.questions)
+            answer_offset = len(columns.distinct_answers)
+            columns.questions.extend(part.questions)
+            columns.matchers.extend(part.matchers)
+            user_map = array("l")
+            for email in part.users:
+                user_num = user_index.get(email)
+                if user_num is None:
+                    user_num = user_index[email] = len(columns.users)
+                    columns.users.append(email)
+                user_map.append(user_num)
+            columns.distinct_answers.extend((question_num + question_offset, answer_text)
+                                            for question_num, answer_text in part.distinct_answers)
+            columns.user_col.extend(map(user_map.__getitem__, part.user_col))
+            columns.answer_col.extend(
+                answer_num + answer_offset for answer_num in part.answer_col)
+            if isinstance(part.answer_ids, list) and not isinstance(columns.answer_ids, list):
+                columns.answer_ids = list(columns.answer_ids)
+            columns.answer_ids.extend(part.answer_ids)
+        columns._user_index = user_index
+        columns._answer_index = {key: answer_num for answer_num,
+                                 key in enumerate(columns.distinct_answers)}
+        return columns
+
+    def __len__(self):
+        return len(self.user_col)
+
+    def match_distinct(self, fuzzy_threshold=None, start=0, fuzzy_matchers=None):
+        '''
+        Match every distinct answer from start on once and return an array of BLANK, MISMATCH or MATCH for each. With a fuzzy_threshold, near misses count as matches (see fuzzy.FuzzyMatcher); fuzzy_matchers is a dict to keep each question's between calls
+        '''
+        verdicts = array("b")
+        if fuzzy_matchers is None:
+            fuzzy_matchers = {}
+        near_misses = 0
+        for question_num, answer_text in self.distinct_answers[start:]:
+            if answer_text == "":
+                verdicts.append(BLANK)
+            elif self.matchers[question_num].match(answer_text):
+                verdicts.append(MATCH)
+            elif fuzzy_threshold is None:
+                verdicts.append(MISMATCH)
+            else:
+                fuzzy_matcher = fuzzy_matchers.get(question_num)
+                if fuzzy_matcher is None:
+                    fuzzy_matcher = fuzzy_matchers[question_num] = FuzzyMatcher(
+                        self.matchers[question_num], fuzzy_threshold)
+                if fuzzy_matcher.match(answer_text):
+                    LOGGER.debug("Accepting \"{}\" as near \"{}\"".format(
+                        answer_text, self.questions[question_num]["questionAnswer"]["answer"]))
+                    near_misses += 1
+                    verdicts.append(MATCH)
+                else:
+                    verdicts.append(MISMATCH)
+        if near_misses:
+            LOGGER.info("Accepted {} distinct near-miss answers".format(near_misses))
+        return verdicts
+
+
+def _prompt_accept(email, question, answer_text):
+    '''
+    Show a non-matching answer and ask whether to accept it anyway
+    '''
+    print("! {} answered with non-matching answer for question \"{}\".\n    User answer: {}\n    Actual answer: {} ({})".format(
+        email, question["questionText"], answer_text, question["questionAnswer"]["answer"], QUESTION_TYPES[question["questionAnswer"]["type"]]))
+    return y_to_continue("? Accept answer?")
+
+
+def _score(columns, accepted):
+    '''
+    Total accepted answers per user, ordered by each user's first accepted answer
+    '''
+    if np is not None:
+        users = np.frombuffer(columns.user_col, dtype="l")[
+            np.frombuffer(accepted, dtype="b").astype(bool)]
+        counts = np.bincount(users, minlength=len(columns.users))
+        _, first = np.unique(users, return_index=True)
+        order = users[np.sort(first)]
+        return {columns.users[user_num]: int(counts[user_num]) for user_num in order}
+    scores = {}
+    for user_num, ok in zip(columns.user_col, accepted):
+        if ok:
+            email = columns.users[user_num]
+            scores[email] = scores.get(email, 0) + 1
+    return scores
+
+
+def grade_columns(columns, accept=_prompt_accept, fuzzy_threshold=None):
+    '''
+    Grade a quiz's columns and return each user's score. accept is called with (email, question, answer_text) for every non-matching answer, in answer order; with a fuzzy_threshold, near misses are accepted without asking
+    '''
+    return _score(columns, accept_columns(columns, accept, fuzzy_threshold))
+
+
+def accept_columns(columns, accept=_prompt_accept, fuzzy_threshold=None, verdicts=None):
+    '''
+    Grade a quiz's columns like grade_columns, but return an array of 1 for each accepted answer and 0 for the rest. verdicts are what match_distinct returned, if that was done already
+    '''
+    if verdicts is None:
+        verdicts = columns.match_distinct(fuzzy_threshold)
+    if np is not None:
+        row_verdicts = np.frombuffer(verdicts, dtype="b")[
+            np.frombuffer(columns.answer_col, dtype="l")]
+        mismatches = np.flatnonzero(row_verdicts == MISMATCH).tolist()
+        accepted = array("b", (row_verdicts == MATCH).astype("b").tobytes())
+    else:
+        accepted = array("b", (verdicts[answer_num] ==
+                               MATCH for answer_num in columns.answer_col))
+        mismatches = [row for row, answer_num in enumerate(
+            columns.answer_col) if verdicts[answer_num] == MISMATCH]
+    for row in mismatches:
+        question_num, answer_text = columns.distinct_answers[columns.answer_col[row]]
+        if accept(columns.users[columns.user_col[row]], columns.questions[question_num], answer_text):
+            accepted[row] = 1
+    return accepted
+
+
+def iter_graded_batches(answers_data, user_data, secret, batch_size=BATCH_SIZE, fuzzy_threshold=None):
+    '''
+    Grade answers data (a payload or a stream of records) batch_size records at a time, without asking about anything. A batch's new users are looked up and its new distinct answers matched only when its turn comes, so the first scores are out long before the whole quiz is graded. Yield (the columns built so far, answers done so far, points per user for the batch's matching answers, rows of the batch's non-matching answers)
+    '''
+    columns = QuizColumns()
+    verdicts = array("b")
+    fuzzy_matchers = {}
+    emails = {}
+    records = iter(_iter_answer_records(answers_data))
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            break
+        new_users = [user_id for user_id in _iter_user_ids(
+            batch) if user_id not in emails]
+        if new_users:
+            emails.update(resolve_emails(user_data, new_users, secret))
+        start = len(columns)
+        columns.extend((question, answer, None if answer is None else emails[answer["userID"]])
+                       for question, answer in batch)
+        verdicts.extend(columns.match_distinct(
+            fuzzy_threshold, len(verdicts), fuzzy_matchers))
+        scores = {}
+        mismatches = []
+        for row in range(start, len(columns)):
+            verdict = verdicts[columns.answer_col[row]]
+            if verdict == MATCH:
+                email = columns.users[columns.user_col[row]]
+                scores[email] = scores.get(email, 0) + 1
+            elif verdict == MISMATCH:
+                mismatches.append(row)
+        if columns.quiz_number is None:
+            # A stream only knows its quiz number once it has started
+            columns.quiz_number = _get_answers_quiz_number(answers_data)
+        yield columns, len(columns), scores, mismatches
+
+
+def _announce_highest_score(scores):
+    '''
+    Print and return the user with the highest score
+    '''
+    highest_score_user = max(scores.items(), key=operator.itemgetter(1))[0]
+    print("! The user with the highest score is {} (score: {}). You may want to notify them that they won something!".format(
+        highest_score_user, scores[highest_score_user]))
+    return highest_score_user
+
+
+def grade_answers(answers_data, user_data, secret, accept=_prompt_accept, fuzzy_threshold=None, archive=None):
+    '''
+    Grade a whole quiz in bulk and return the highest scoring user and the rest of the scores. The results are also stored in archive (an archive.QuizArchive) if given
+    '''
+    columns = QuizColumns.from_answers(answers_data, user_data, secret)
+    LOGGER.debug("Grading {} answers ({} distinct)".format(
+        len(columns), len(columns.distinct_answers)))
+    accepted = accept_columns(columns, accept, fuzzy_threshold)
+    if archive is not None:
+        archive.record(columns, accepted)
+    scores = _score(columns, accepted)
+    return _announce_highest_score(scores), scores
+
+
+def review_key(question, answer_text):
+    '''
+    Return the key a review decision is stored under: the question's text, its answer key and type, and the user's answer, normalized. A decision thus only applies to the same answer to the same question with the same answer key, even in another quiz
+    '''
+    try:
+        normalized = _normalize_answer(answer_text)
+    except AttributeError:
+        # A JSON list of things that are not strings
+        normalized = [answer_text.upper()]
+    actual_answer = question["questionAnswer"]
+    return (question["questionText"], tuple(actual_answer["answer"]), QUESTION_TYPES[actual_answer["type"]], tuple(normalized))
+
+
+def load_decisions(filename):
+    '''
+    Read a reviewed queue file and return its decisions as a dict of review key to whether the answer is accepted. Entries that have not been decided are skipped
+    '''
+    decisions = {}
+    with open(filename) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("accept") is not None:
+                decisions[(entry["question"], tuple(entry["actual_answer"]), entry["type"], tuple(entry["answer"]))] = bool(
+                    entry["accept"])
+    return decisions
+
+
+class DeferredReview:
+    '''
+    An accept callback that never prompts. Answers with a decision are accepted or rejected by it; the rest are rejected for now and queued for review, once per review key
+    '''
+
+    def __init__(self, decisions=None):
+        self.decisions = {} if decisions is None else decisions
+        self.pending = {}
+        self._keys = {}
+
+    def __call__(self, email, question, answer_text):
+        raw_key = (question["questionText"], tuple(
+            question["questionAnswer"]["answer"]), question["questionAnswer"]["type"], answer_text)
+        key = self._keys.get(raw_key)
+        if key is None:
+            key = self._keys[raw_key] = review_key(question, answer_text)
+        try:
+            return self.decisions[key]
+        except KeyError:
+            pass
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.pending[key] = {
+                "question": key[0],
+                "answer": list(key[3]),
+                # With the question, these are what load_decisions matches decisions on
+                "actual_answer": list(key[1]),
+                "type": key[2],
+                "user_answers": [],
+                "users": [],
+                "accept": None
+            }
+        if answer_text not in entry["user_answers"]:
+            entry["user_answers"].append(answer_text)
+        entry["users"].append(email)
+        return False
+
+    def write(self, filename):
+        '''
+        Write the queued answers to a JSON Lines file. Fill in each line's "accept" with true or false and pass the file to load_decisions
+        '''
+        with open(filename, "w") as f:
+            for entry in self.pending.values():
+                f.write(json.dumps(entry) + "\n")
+        return filename
+
+
+def grade_answers_deferred(answers_data, user_data, secret, queue_filename, decisions=None, fuzzy_threshold=None, archive=None):
+    '''
+    Grade a whole quiz without prompting. Non-matching answers without a decision are written to queue_filename; return the highest scoring user, the scores so far and the number of answers still awaiting review. The results so far are also stored in archive if given
+    '''
+    review = DeferredReview(decisions)
+    columns = QuizColumns.from_answers(answers_data, user_data, secret)
+    accepted = accept_columns(columns, review, fuzzy_threshold)
+    if archive is not None:
+        archive.record(columns, accepted)
+    scores = _score(columns, accepted)
+    review.write(queue_filename)
+    if review.pending:
+        print("! {} answers need review; see {}".format(
+            len(review.pending), queue_filename))
+    return _announce_highest_score(scores) if scores else None, scores, len(review.pending)
+
+
+class GradingCheckpoint:
+    '''
+    The answer IDs already graded for a quiz and the scores they added up to
+    '''
+
+    def __init__(self, filename, answer_ids=None, scores=None):
+        self.filename = filename
+        self.answer_ids = set() if answer_ids is None else answer_ids
+        self.scores = {} if scores is None else scores
+
+    @classmethod
+    def load(cls, quiz_number, folder=CHECKPOINT_FOLDER):
+        '''
+        Load a quiz's checkpoint, or start an empty one if there is none
+        '''
+        filename = os.path.join(folder, "quiz-{}.json".format(quiz_number))
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(filename)
+        return cls(filename, set(data["answer_ids"]), data["scores"])
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        # A temporary file of its own, so that saves at the same time cannot trip over each other
+        fd, temp_filename = tempfile.mkstemp(
+            dir=os.path.dirname(self.filename), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"answer_ids": list(self.answer_ids),
+                           "scores": self.scores}, f)
+            os.replace(temp_filename, self.filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+    def delete(self):
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+        self.answer_ids = set()
+        self.scores = {}
+
+
+def grade_answers_incremental(user_data, secret, answers_data=None, quiz_number=None, stream=False, accept=_prompt_accept, reset=False, checkpoint_folder=CHECKPOINT_FOLDER, fuzzy_threshold=None):
+    '''
+    Grade only the answers that were not graded by an earlier call for the same quiz, fold them into that call's scores, and return the highest scoring user and the scores. Pass reset=True to start over, e.g. after the answer key changes
+    '''
+    answers_data = _get_answers(secret, answers_data, quiz_number, stream)
+    records = _iter_answer_records(answers_data)
+    # Pull the first record so a stream has seen its quiz number
+    first = next(records, None)
+    if first is not None:
+        records = itertools.chain([first], records)
+    checkpoint = GradingCheckpoint.load(
+        _get_answers_quiz_number(answers_data), checkpoint_folder)
+    if reset:
+        checkpoint.delete()
+    answer_ids = checkpoint.answer_ids
+    new_answer_ids = []
+
+    def new_records():
+        for question, answer in records:
+            if answer is None or answer["answerID"] in answer_ids:
+                continue
+            new_answer_ids.append(answer["answerID"])
+            yield question, answer
+
+    columns = QuizColumns.from_answers(new_records(), user_data, secret)
+    LOGGER.debug("Grading {} new answers ({} already graded)".format(
+        len(columns), len(answer_ids)))
+    for user, score in grade_columns(columns, accept, fuzzy_threshold).items():
+        checkpoint.scores[user] = checkpoint.scores.get(user, 0) + score
+    answer_ids.update(new_answer_ids)
+    checkpoint.save()
+    scores = checkpoint.scores
+    return _announce_highest_score(scores), scores
+
+
+def _split_quiz(answers_data, chunk_size):
+    '''
+    Split an ANSWERS payload into payloads of consecutive whole questions with about chunk_size answers each
+    '''
+    questions = []
+    count = 0
+    for question in answers_data["questions"]:
+        questions.append(question)
+        count += len(question["userAnswers"])
+        if count >= chunk_size:
+            yield {"quizNumber": answers_data["quizNumber"], "questions": questions}
+            questions = []
+            count = 0
+    if questions or not answers_data["questions"]:
+        yield {"quizNumber": answers_data["quizNumber"], "questions": questions}
+
+
+def _match_chunk(answers_data, user_data, fuzzy_threshold):
+    '''
+    Build and match the columns of a chunk of a quiz whose users are all in user_data
+    '''
+    columns = QuizColumns.from_answers(answers_data, user_data, None)
+    verdicts = columns.match_distinct(fuzzy_threshold)
+    # The answers are in the columns now, so don't send them all back
+    columns.questions = [{key: value for key, value in question.items() if key != "userAnswers"}
+                         for question in columns.questions]
+    return columns, verdicts
+
+
+# Each worker process's copy of the users grade_quizzes looked up
+_WORKER_USER_DATA = None
+
+
+def _init_worker(user_data):
+    global _WORKER_USER_DATA
+    _WORKER_USER_DATA = user_data
+
+
+def _match_chunk_in_worker(answers_data, fuzzy_threshold):
+    return _match_chunk(answers_data, _WORKER_USER_DATA, fuzzy_threshold)
+
+
+def grade_quizzes(answers_list, user_data, secret, accepts=None, fuzzy_threshold=None, max_workers=None, chunk_size=PROCESS_CHUNK_SIZE, archive=None):
+    '''
+    Grade several quizzes' ANSWERS payloads and return the combined scores and a list of each quiz's scores. Users are looked up once for all of them; the answers are matched in up to max_workers processes (one per CPU if None), chunk_size answers' worth of whole questions at a time. accepts is a list of each quiz's accept function (_prompt_accept if None), which are asked about non-matching answers here, a quiz at a time. The results are also stored in archive if given
+    '''
+    answers_list = list(answers_list)
+    user_ids = list(_iter_user_ids(
+        record for answers_data in answers_list for record in _iter_answer_records(answers_data)))
+    # Workers only need emails, not everything the API says about a user
+    directory = {user_id: {"email": email} for user_id,
+                 email in resolve_emails(user_data, user_ids, secret).items()}
+    chunks = []
+    chunk_quizzes = []
+    for quiz_index, answers_data in enumerate(answers_list):
+        for chunk in _split_quiz(answers_data, chunk_size):
+            chunks.append(chunk)
+            chunk_quizzes.append(quiz_index)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(chunks))
+    LOGGER.debug("Grading {} quizzes in {} chunks with {} processes".format(
+        len(answers_list), len(chunks), max_workers))
+    if max_workers <= 1:
+        results = [_match_chunk(chunk, directory, fuzzy_threshold)
+                   for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(directory,)) as executor:
+            results = list(executor.map(_match_chunk_in_worker,
+                                        chunks, itertools.repeat(fuzzy_threshold)))
+
+    combined = {}
+    quiz_scores = []
+    for quiz_index in range(len(answers_list)):
+        parts = [result for result, chunk_quiz in zip(
+            results, chunk_quizzes) if chunk_quiz == quiz_index]
+        columns = QuizColumns.concat(columns for columns, _ in parts)
+        verdicts = array("b")
+        for _, part_verdicts in parts:
+            verdicts.extend(part_verdicts)
+        accept = _prompt_accept if accepts is None else accepts[quiz_index]
+        accepted = accept_columns(columns, accept, verdicts=verdicts)
+        if archive is not None:
+            archive.record(columns, accepted)
+        scores = _score(columns, accepted)
+        for user, score in scores.items():
+            combined[user] = combined.get(user, 0) + score
+        quiz_scores.append(scores)
+    return combined, quiz_scores
@@ -5,63 +5,72 @@ import sys
 
 import zmtools
 from PyQt5 import QtCore, QtGui, QtWidgets
-from PyQt5.QtCore import QThread, pyqtSignal
 
-from .common import post, create_quiz, export_data, set_quiz
-from .secretstuff import SecretStuff
+from .common import fetch_answers, create_quiz, set_quiz
+from .grading import iter_graded_batches, review_key
+from .gui_tasks import Task, TaskScheduler
+from .metrics import METRICS
+from .model import QuizAnswers
+from .watch import QuizWatcher
+from . import SecretStuff
+from .user_cache import open_user_cache
 
-from .gui_layouts import quiz_dialogs
-
-zmtools.init_logging()
+from .gui_layouts import answer_dialogs, grading_dialogs, quiz_dialogs, watch_dialogs
 
 SECRET = None
-USER_DATA = {}
+USER_DATA = None
 LOGGER = logging.getLogger(__name__)
 
 
-class Worker(QtCore.QThread):
-    output = pyqtSignal(object)
-
-    def __init__(self):
-        super(Worker, self).__init__()
-
-    def _run(self):
-        # Override me
-        LOGGER.info("No action to take")
-
-    def run(self):
-        result = self._run()
-        self.output.emit(result)
-
-
-class ShowAnswersWorker(Worker):
-    def __init__(self, quiz_number):
-        self.quiz_number = quiz_number
-        super(ShowAnswersWorker, self).__init__()
-
-    def _run(self):
-        LOGGER.info(f"Retrieving answers for quiz {self.quiz_number}")
-        return _show_answers(self.quiz_number)
-
+class GradeAnswersTask(Task):
+    '''
+    Grades a quiz without asking about anything, reporting each batch's scores and non-matching answers as progress
+    '''
 
-class SetQuizWorker(Worker):
     def __init__(self, quiz_number):
+        super(GradeAnswersTask, self).__init__(
+            f"Grading quiz #{quiz_number}")
         self.quiz_number = quiz_number
-        super(SetQuizWorker, self).__init__()
 
     def _run(self):
-        LOGGER.info(f"Setting quiz to {self.quiz_number}")
-        return _set_quiz(self.quiz_number)
-
+        LOGGER.info(f"Grading quiz {self.quiz_number}")
+        answers_data = fetch_answers(SECRET, self.quiz_number)
+        self.check_cancelled()
+        total = sum(len(question["userAnswers"])
+                    for question in answers_data["questions"])
+        keys = {}
+        done = 0
+        for columns, done, scores, mismatch_rows in iter_graded_batches(answers_data, USER_DATA, SECRET):
+            self.check_cancelled()
+            mismatches = []
+            for row in mismatch_rows:
+                answer_num = columns.answer_col[row]
+                question_num, answer_text = columns.distinct_answers[answer_num]
+                question = columns.questions[question_num]
+                key = keys.get(answer_num)
+                if key is None:
+                    key = keys[answer_num] = review_key(question, answer_text)
+                mismatches.append(
+                    (key, columns.users[columns.user_col[row]], question, answer_text))
+            self.report_progress({"done": done, "total": total,
+                                  "scores": scores, "mismatches": mismatches})
+        return done
+
+
+class WatchTask(Task):
+    '''
+    Polls the current quiz until cancelled, reporting each poll's events as progress
+    '''
 
-class CreateQuizWorker(Worker):
-    def __init__(self, quiz_data):
-        self.quiz_data = quiz_data
-        super(CreateQuizWorker, self).__init__()
+    def __init__(self):
+        super(WatchTask, self).__init__("Watching the current quiz")
 
     def _run(self):
-        LOGGER.info(f"Creating quiz with data:\n{self.quiz_data}")
-        return _create_quiz(self.quiz_data)
+        watcher = QuizWatcher(SECRET, USER_DATA)
+        for events in watcher.watch(self._cancel_event):
+            self.report_progress(events)
+        # The watcher stops quietly, but the task was cancelled
+        self.check_cancelled()
 
 
 def open_file_with_default_program(filename):
@@ -77,10 +86,10 @@ def open_file_with_default_program(filename):
             subprocess.check_call(["open", filename])
 
 
-def _show_answers(quiz_number):
-    answers_data = post("ANSWERS", {"quizNumber": quiz_number}, SECRET)
-    filename = export_data(answers_data, USER_DATA, SECRET)
-    open_file_with_default_program(filename)
+def _load_answers(quiz_number):
+    answers = QuizAnswers.from_json(fetch_answers(SECRET, quiz_number))
+    answers.resolve_users(USER_DATA, SECRET)
+    return answers
 
 
 def _set_quiz(quiz_number):
@@ -103,13 +112,15 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setFixedSize(600, 400)
         self.centralwidget = QtWidgets.QWidget(self)
         self.layoutWidget = QtWidgets.QWidget(self.centralwidget)
-        self.layoutWidget.setGeometry(QtCore.QRect(210, 120, 179, 177))
+        self.layoutWidget.setGeometry(QtCore.QRect(210, 105, 179, 210))
         self.verticalLayout_2 = QtWidgets.QVBoxLayout(self.layoutWidget)
 
         self.viewAnswers = QtWidgets.QPushButton(
             "View answers", self.layoutWidget)
         self.gradeAnswers = QtWidgets.QPushButton(
             "Grade answers", self.layoutWidget)
+        self.watchQuiz = QtWidgets.QPushButton(
+            "Watch live quiz", self.layoutWidget)
         self.closeQuiz = QtWidgets.QPushButton("Close quiz", self.layoutWidget)
         self.setQuiz = QtWidgets.QPushButton("Set quiz", self.layoutWidget)
         self.createQuiz = QtWidgets.QPushButton(
@@ -119,6 +130,8 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.verticalLayout_2.addWidget(self.gradeAnswers)
 
+        self.verticalLayout_2.addWidget(self.watchQuiz)
+
         self.verticalLayout_2.addWidget(self.closeQuiz)
 
         self.verticalLayout_2.addWidget(self.setQuiz)
@@ -129,6 +142,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.statusBar = QtWidgets.QStatusBar(self)
         self.statusBar.showMessage("Idle")
         self.setStatusBar(self.statusBar)
+        self.cancelTasks = QtWidgets.QPushButton("Cancel", self.statusBar)
+        self.cancelTasks.setFlat(True)
+        self.cancelTasks.setEnabled(False)
+        self.statusBar.addPermanentWidget(self.cancelTasks)
+        self.showMetrics = QtWidgets.QPushButton("Metrics", self.statusBar)
+        self.showMetrics.setFlat(True)
+        self.statusBar.addPermanentWidget(self.showMetrics)
+
+        self.scheduler = TaskScheduler(self)
+        self.scheduler.tasks_changed.connect(self.show_tasks)
 
         self.viewAnswers.setDefault(False)
 
@@ -138,11 +161,15 @@ class MainWindow(QtWidgets.QMainWindow):
         # Set buttons' actions
         self.viewAnswers.clicked.connect(
             lambda: self._prompt_for_quiz_num_and_perform_action(self.show_answers))
-        self.gradeAnswers.clicked.connect(self.alert_not_implemented)
+        self.gradeAnswers.clicked.connect(
+            lambda: self._prompt_for_quiz_num_and_perform_action(self.grade_answers))
+        self.watchQuiz.clicked.connect(self.watch_quiz)
         self.closeQuiz.clicked.connect(self.close_quiz)
         self.setQuiz.clicked.connect(
             lambda: self._prompt_for_quiz_num_and_perform_action(self.set_quiz))
         self.createQuiz.clicked.connect(self.open_create_quiz_dialog)
+        self.showMetrics.clicked.connect(self.show_metrics)
+        self.cancelTasks.clicked.connect(self.scheduler.cancel_all)
 
     def _prompt_for_quiz_num_and_perform_action(self, f):
         quiz_number, ok = QtWidgets.QInputDialog.getInt(
@@ -160,59 +187,76 @@ class MainWindow(QtWidgets.QMainWindow):
     def open_create_quiz_dialog(self):
         self.createQuizQuestionForm.show()
 
+    def _run_task(self, description, f, *args):
+        task = self.scheduler.run(description, f, *args)
+        task.signals.error.connect(
+            lambda e: self.alert(f"{description} failed: {e}"))
+        return task
+
     def close_quiz(self):
-        self.block_show_load("Closing quiz...")
-        self.worker = SetQuizWorker(0)
-        self.worker.finished.connect(self.reset_all)
-        self.worker.start()
+        self._run_task("Closing quiz", _set_quiz, 0)
 
     def set_quiz(self, quiz_number):
         if quiz_number != 0:
-            msg = "Setting quiz..."
+            description = f"Setting quiz to #{quiz_number}"
         else:
-            msg = "Closing quiz..."
-        self.block_show_load(msg)
-        self.worker = SetQuizWorker(quiz_number)
-        self.worker.output.connect(self.show)
-        self.worker.output.connect(self.reset_all)
-        self.worker.start()
+            description = "Closing quiz"
+        self._run_task(description, _set_quiz, quiz_number)
 
     def create_quiz(self, quiz_data):
-        self.block_show_load("Creating quiz...")
-        self.worker = CreateQuizWorker(quiz_data)
-        self.worker.output.connect(self.ask_to_set_quiz)
-        self.worker.output.connect(self.show)
-        self.worker.output.connect(self.reset_all)
-        self.worker.start()
+        task = self._run_task("Creating quiz", _create_quiz, quiz_data)
+        task.signals.output.connect(self.ask_to_set_quiz)
 
     def show_answers(self, quiz_number):
-        self.block_show_load("Retrieving answers...")
-        self.worker = ShowAnswersWorker(quiz_number)
-        self.worker.finished.connect(self.reset_all)
-        self.worker.start()
+        dialog = answer_dialogs.AnswersDialog(quiz_number, self.scheduler, self)
+        dialog.exported.connect(self.ask_to_open_file)
+        dialog.attach(self._run_task(
+            f"Retrieving answers for quiz #{quiz_number}", _load_answers, quiz_number))
+        dialog.show()
+
+    def ask_to_open_file(self, filename):
+        self._ask_if_should_perform_action(
+            f"Exported to {filename}. Open it?", lambda: open_file_with_default_program(filename))
+
+    def grade_answers(self, quiz_number):
+        task = GradeAnswersTask(quiz_number)
+        task.signals.error.connect(
+            lambda e: self.alert(f"{task.description} failed: {e}"))
+        dialog = grading_dialogs.GradingDialog(quiz_number, self)
+        dialog.attach(task)
+        self.scheduler.submit(task)
+        dialog.show()
+
+    def watch_quiz(self):
+        task = WatchTask()
+        task.signals.error.connect(
+            lambda e: self.alert(f"{task.description} failed: {e}"))
+        dialog = watch_dialogs.LiveDialog(self.scheduler, self)
+        dialog.attach(task)
+        self.scheduler.submit(task)
+        dialog.show()
 
     def ask_to_set_quiz(self, result):
         self._ask_if_should_perform_action(
             f"Go live with new quiz (#{result})?", lambda: self.set_quiz(int(result)))
 
-    def reset_all(self):
-        self.set_enabled_everything(True)
-        self.statusBar.showMessage("Idle")
-
-    def set_enabled_everything(self, enabled):
-        self.viewAnswers.setEnabled(enabled)
-        self.gradeAnswers.setEnabled(enabled)
-        self.closeQuiz.setEnabled(enabled)
-        self.setQuiz.setEnabled(enabled)
-        self.createQuiz.setEnabled(enabled)
-
-    def block_show_load(self, status):
-        self.set_enabled_everything(False)
-        self.statusBar.showMessage(status)
-        self.show()
+    def show_tasks(self, descriptions):
+        self.cancelTasks.setEnabled(bool(descriptions))
+        if not descriptions:
+            self.statusBar.showMessage("Idle")
+        elif len(descriptions) == 1:
+            self.statusBar.showMessage(f"{descriptions[0]}...")
+        else:
+            self.statusBar.showMessage(
+                f"{len(descriptions)} tasks: {', '.join(descriptions)}")
 
-    def alert_not_implemented(self):
-        self.alert("Not implemented yet")
+    def show_metrics(self):
+        metrics_box = QtWidgets.QMessageBox(self)
+        metrics_box.setWindowTitle("Metrics")
+        metrics_box.setText("API and user cache metrics for this session")
+        metrics_box.setDetailedText(METRICS.to_json())
+        metrics_box.setStandardButtons(QtWidgets.QMessageBox.Ok)
+        metrics_box.show()
 
     def alert(self, text):
         alert = QtWidgets.QMessageBox(self)
@@ -222,17 +266,29 @@ class MainWindow(QtWidgets.QMainWindow):
         alert.setStandardButtons(QtWidgets.QMessageBox.Ok)
         alert.show()
 
+    def closeEvent(self, event):
+        self.scheduler.cancel_all()
+        self.scheduler.pool.waitForDone()
+        super(MainWindow, self).closeEvent(event)
+
+
 def main():
-    global SECRET
+    global SECRET, USER_DATA
+    zmtools.init_logging()
     if "--test-mode" in sys.argv:
         LOGGER.info("Test mode enabled")
         SECRET = SecretStuff(True)
     else:
         SECRET = SecretStuff(False)
+    USER_DATA = {} if "--no-user-cache" in sys.argv else open_user_cache(
+        SECRET)
     app = QtWidgets.QApplication(sys.argv)
     mainwin = MainWindow()
     mainwin.show()
-    return app.exec_()
+    out = app.exec_()
+    if not isinstance(USER_DATA, dict):
+        USER_DATA.close()
+    return out
 
 
 if __name__ == "__main__":
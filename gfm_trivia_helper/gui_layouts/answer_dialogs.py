@@ -0,0 +1,227 @@
+import logging
+import os
+from array import array
+
+from PyQt5 import QtCore, QtWidgets
+
+from ..common import RESULTS_FOLDER
+from ..export import EXPORTERS, get_exporter
+from ..model import QuizAnswers
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _answer_id_key(answer_id):
+    # IDs are integers or strings; sort the integers numerically, before any strings
+    if isinstance(answer_id, int):
+        return 0, answer_id, ""
+    return 1, 0, str(answer_id)
+
+
+class AnswersTableModel(QtCore.QAbstractTableModel):
+    '''
+    Shows the rows of a QuizAnswers (with its users resolved) that pass the current filters. Cells are only looked up when the view draws them, and filtering narrows a list of row numbers instead of copying rows
+    '''
+
+    HEADERS = ("User", "Question", "Answer", "Answer ID")
+
+    def __init__(self, parent=None):
+        super(AnswersTableModel, self).__init__(parent)
+        self.rows = QuizAnswers()
+        self.visible = array("l")
+        self._filters = (None, "", "")
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.visible)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return None
+        return self.rows.row(self.visible[index.row()])[index.column()]
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.visible = array("l", range(len(rows)))
+        self._filters = (None, "", "")
+        self.endResetModel()
+
+    def set_filters(self, question_num=None, user_text="", search_text=""):
+        '''
+        Show only the answers to a question (all if None), from users containing user_text, and containing search_text. When the filters only get narrower, just the rows already shown are checked again
+        '''
+        user_text = user_text.casefold()
+        search_text = search_text.casefold()
+        old_question_num, old_user_text, old_search_text = self._filters
+        if (old_question_num is None or question_num == old_question_num) and user_text.startswith(old_user_text) and search_text.startswith(old_search_text):
+            candidates = self.visible
+        else:
+            candidates = range(len(self.rows))
+        self._filters = (question_num, user_text, search_text)
+
+        rows = self.rows
+        if user_text:
+            users = {user_num for user_num, user in enumerate(
+                rows.emails) if user_text in user.casefold()}
+        visible = array("l")
+        for row in candidates:
+            if question_num is not None and rows.question_col[row] != question_num:
+                continue
+            if user_text and rows.user_col[row] not in users:
+                continue
+            if search_text and search_text not in rows.texts[row].casefold():
+                continue
+            visible.append(row)
+        self.beginResetModel()
+        self.visible = visible
+        self.endResetModel()
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        rows = self.rows
+        keys = (lambda row: rows.email(row).casefold(),
+                lambda row: rows.question_col[row],
+                lambda row: rows.texts[row].casefold(),
+                lambda row: _answer_id_key(rows.answer_ids[row]))
+        self.layoutAboutToBeChanged.emit()
+        self.visible = array("l", sorted(self.visible, key=keys[column],
+                                         reverse=order == QtCore.Qt.DescendingOrder))
+        self.layoutChanged.emit()
+
+    def iter_visible(self):
+        '''
+        Yield the rows that pass the current filters, as export writers take them
+        '''
+        for row in self.visible:
+            yield self.rows.row(row)
+
+
+class AnswersDialog(QtWidgets.QDialog):
+    '''
+    Browse a quiz's answers in the app, filtering by question or user and searching answers as you type, and export what is shown
+    '''
+
+    # Emitted with the filename after an export finishes
+    exported = QtCore.pyqtSignal(str)
+
+    def __init__(self, quiz_number, scheduler, parent=None):
+        super(AnswersDialog, self).__init__(parent)
+        self.quiz_number = quiz_number
+        self.scheduler = scheduler
+        self.task = None
+
+        self.setWindowTitle(f"Answers for quiz #{quiz_number}")
+        self.resize(900, 600)
+
+        self.answersModel = AnswersTableModel(self)
+        self.answersView = QtWidgets.QTableView()
+        self.answersView.setModel(self.answersModel)
+        self.answersView.setSortingEnabled(True)
+        self.answersView.horizontalHeader().setStretchLastSection(True)
+        self.answersView.verticalHeader().hide()
+        # All rows are one line high, so the view need not measure them
+        self.answersView.verticalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.Fixed)
+        self.answersView.setWordWrap(False)
+
+        self.questionFilter = QtWidgets.QComboBox()
+        self.questionFilter.addItem("All questions")
+        self.userFilter = QtWidgets.QLineEdit()
+        self.userFilter.setPlaceholderText("Filter by user")
+        self.userFilter.setClearButtonEnabled(True)
+        self.searchField = QtWidgets.QLineEdit()
+        self.searchField.setPlaceholderText("Search answers")
+        self.searchField.setClearButtonEnabled(True)
+        self.questionFilter.currentIndexChanged.connect(self.apply_filters)
+        self.userFilter.textChanged.connect(self.apply_filters)
+        self.searchField.textChanged.connect(self.apply_filters)
+
+        filtersRow = QtWidgets.QHBoxLayout()
+        filtersRow.addWidget(self.questionFilter, 2)
+        filtersRow.addWidget(self.userFilter, 1)
+        filtersRow.addWidget(self.searchField, 1)
+
+        self.countLabel = QtWidgets.QLabel("Retrieving answers...")
+        self.exportButton = QtWidgets.QPushButton("Export...")
+        self.exportButton.setEnabled(False)
+        self.exportButton.clicked.connect(self.export)
+
+        bottomRow = QtWidgets.QHBoxLayout()
+        bottomRow.addWidget(self.countLabel, 1)
+        bottomRow.addWidget(self.exportButton)
+
+        mainLayout = QtWidgets.QVBoxLayout()
+        mainLayout.addLayout(filtersRow)
+        mainLayout.addWidget(self.answersView)
+        mainLayout.addLayout(bottomRow)
+        self.setLayout(mainLayout)
+
+    def attach(self, task):
+        '''
+        Show the QuizAnswers a task outputs
+        '''
+        self.task = task
+        task.signals.output.connect(self.set_rows)
+        task.signals.error.connect(
+            lambda e: self.countLabel.setText(f"Retrieving answers failed: {e}"))
+        task.signals.cancelled.connect(
+            lambda: self.countLabel.setText("Cancelled"))
+
+    def set_rows(self, rows):
+        if rows.quiz_number is not None:
+            self.setWindowTitle(f"Answers for quiz #{rows.quiz_number}")
+        self.questionFilter.blockSignals(True)
+        self.questionFilter.clear()
+        self.questionFilter.addItem("All questions")
+        self.questionFilter.addItems(
+            [question.text for question in rows.questions])
+        self.questionFilter.blockSignals(False)
+        self.answersModel.set_rows(rows)
+        self.apply_filters()
+        self.exportButton.setEnabled(True)
+
+    def apply_filters(self):
+        question_num = self.questionFilter.currentIndex() - 1
+        self.answersModel.set_filters(
+            question_num if question_num >= 0 else None, self.userFilter.text(), self.searchField.text())
+        shown = self.answersModel.rowCount()
+        total = len(self.answersModel.rows)
+        if shown == total:
+            self.countLabel.setText(f"{total} answers")
+        else:
+            self.countLabel.setText(f"{shown} of {total} answers")
+
+    def export(self):
+        default = os.path.join(
+            RESULTS_FOLDER, f"gfmquizresults-{self.answersModel.rows.quiz_number}.csv")
+        name_filters = ";;".join(
+            f"{extension} (*{extension})" for extension in EXPORTERS)
+        filename, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export shown answers", default, name_filters)
+        if not filename:
+            return
+        try:
+            exporter = get_exporter(filename)
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Export", str(e))
+            return
+        # Take the rows now so later filtering does not change what is written
+        rows = list(self.answersModel.iter_visible())
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        task = self.scheduler.run(
+            f"Exporting answers to {filename}", exporter, filename, iter(rows))
+        task.signals.output.connect(lambda _: self.exported.emit(filename))
+        task.signals.error.connect(lambda e: QtWidgets.QMessageBox.warning(
+            self, "Export", f"Exporting failed: {e}"))
+
+    def closeEvent(self, event):
+        if self.task is not None:
+            self.scheduler.cancel(self.task)
+        super(AnswersDialog, self).closeEvent(event)
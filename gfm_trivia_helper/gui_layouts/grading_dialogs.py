@@ -0,0 +1,218 @@
+import logging
+from PyQt5 import QtCore, QtWidgets
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ScoresTableModel(QtCore.QAbstractTableModel):
+    '''
+    Users and their scores, filled in a batch at a time
+    '''
+
+    HEADERS = ("User", "Score")
+
+    def __init__(self, parent=None):
+        super(ScoresTableModel, self).__init__(parent)
+        self.users = []
+        self.scores = []
+        self._rows = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.users)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return self.users[index.row()] if index.column() == 0 else self.scores[index.row()]
+        # Sort scores as numbers, not text
+        if role == QtCore.Qt.UserRole:
+            return self.users[index.row()].lower() if index.column() == 0 else self.scores[index.row()]
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def add_scores(self, scores):
+        '''
+        Add points to users' scores, adding rows for users not seen yet
+        '''
+        new_users = [user for user in scores if user not in self._rows]
+        if new_users:
+            first = len(self.users)
+            self.beginInsertRows(QtCore.QModelIndex(),
+                                 first, first + len(new_users) - 1)
+            for user in new_users:
+                self._rows[user] = len(self.users)
+                self.users.append(user)
+                self.scores.append(0)
+            self.endInsertRows()
+        changed = []
+        for user, points in scores.items():
+            row = self._rows[user]
+            self.scores[row] += points
+            changed.append(row)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), 1), self.index(
+                max(changed), 1), [QtCore.Qt.DisplayRole])
+
+    def clear(self):
+        self.beginResetModel()
+        self.users = []
+        self.scores = []
+        self._rows = {}
+        self.endResetModel()
+
+    def as_dict(self):
+        return dict(zip(self.users, self.scores))
+
+
+class GradingDialog(QtWidgets.QDialog):
+    '''
+    Shows scores as they are graded, and non-matching answers to accept or reject while grading carries on. Each distinct (normalized) answer is decided once for every user who gave it
+    '''
+
+    ACCEPT_TEXT = "Accepted"
+    REJECT_TEXT = "Rejected"
+
+    def __init__(self, quiz_number, parent=None):
+        super(GradingDialog, self).__init__(parent)
+        self.quiz_number = quiz_number
+        self.task = None
+        # Review key -> {"users": [...], "item": QListWidgetItem, "decision": None/True/False}
+        self.reviews = {}
+
+        self.setWindowTitle(f"Grading quiz #{quiz_number}")
+        self.resize(900, 600)
+
+        self.scoresModel = ScoresTableModel(self)
+        self.sortModel = QtCore.QSortFilterProxyModel(self)
+        self.sortModel.setSourceModel(self.scoresModel)
+        self.sortModel.setSortRole(QtCore.Qt.UserRole)
+        self.scoresView = QtWidgets.QTableView()
+        self.scoresView.setModel(self.sortModel)
+        self.scoresView.setSortingEnabled(True)
+        self.scoresView.sortByColumn(1, QtCore.Qt.DescendingOrder)
+        self.scoresView.horizontalHeader().setStretchLastSection(True)
+        self.scoresView.verticalHeader().hide()
+
+        self.reviewLabel = QtWidgets.QLabel("Non-matching answers")
+        self.reviewList = QtWidgets.QListWidget()
+        self.reviewList.setSelectionMode(
+            QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.acceptButton = QtWidgets.QPushButton("Accept")
+        self.rejectButton = QtWidgets.QPushButton("Reject")
+        self.acceptButton.clicked.connect(lambda: self.decide(True))
+        self.rejectButton.clicked.connect(lambda: self.decide(False))
+        self.reviewList.itemDoubleClicked.connect(lambda: self.decide(True))
+
+        reviewButtons = QtWidgets.QHBoxLayout()
+        reviewButtons.addWidget(self.rejectButton)
+        reviewButtons.addWidget(self.acceptButton)
+        reviewLayout = QtWidgets.QVBoxLayout()
+        reviewLayout.addWidget(self.reviewLabel)
+        reviewLayout.addWidget(self.reviewList)
+        reviewLayout.addLayout(reviewButtons)
+        reviewWidget = QtWidgets.QWidget()
+        reviewWidget.setLayout(reviewLayout)
+
+        splitter = QtWidgets.QSplitter()
+        splitter.addWidget(self.scoresView)
+        splitter.addWidget(reviewWidget)
+
+        self.progressBar = QtWidgets.QProgressBar()
+        self.progressBar.setFormat("Retrieving answers...")
+        self.progressBar.setRange(0, 0)
+
+        mainLayout = QtWidgets.QVBoxLayout()
+        mainLayout.addWidget(splitter)
+        mainLayout.addWidget(self.progressBar)
+        self.setLayout(mainLayout)
+
+    def attach(self, task):
+        '''
+        Follow a grading task's progress
+        '''
+        self.task = task
+        task.signals.progress.connect(self.add_batch)
+        task.signals.output.connect(self.grading_done)
+        task.signals.error.connect(
+            lambda e: self.progressBar.setFormat(f"Grading failed: {e}"))
+        task.signals.cancelled.connect(
+            lambda: self.progressBar.setFormat("Grading cancelled"))
+
+    def add_batch(self, batch):
+        if self.progressBar.maximum() != batch["total"]:
+            self.progressBar.setRange(0, batch["total"])
+            self.progressBar.setFormat("Graded %v of %m answers")
+        self.progressBar.setValue(batch["done"])
+        self.scoresModel.add_scores(batch["scores"])
+        accepted = {}
+        for key, email, question, answer_text in batch["mismatches"]:
+            review = self.reviews.get(key)
+            if review is None:
+                item = QtWidgets.QListWidgetItem()
+                item.setData(QtCore.Qt.UserRole, key)
+                review = self.reviews[key] = {
+                    "users": [], "item": item, "decision": None, "question": question, "answer_text": answer_text}
+                self.reviewList.addItem(item)
+            review["users"].append(email)
+            if review["decision"]:
+                accepted[email] = accepted.get(email, 0) + 1
+            self._describe(review)
+        if accepted:
+            self.scoresModel.add_scores(accepted)
+        self._update_review_label()
+
+    def _describe(self, review):
+        question = review["question"]
+        text = "{}\n    Answer: {}\n    Actual: {}\n    {} user(s)".format(
+            question["questionText"], review["answer_text"], ", ".join(question["questionAnswer"]["answer"]), len(review["users"]))
+        if review["decision"] is not None:
+            text += " - " + \
+                (self.ACCEPT_TEXT if review["decision"] else self.REJECT_TEXT)
+        review["item"].setText(text)
+
+    def _update_review_label(self):
+        pending = sum(
+            1 for review in self.reviews.values() if review["decision"] is None)
+        self.reviewLabel.setText(
+            f"Non-matching answers ({pending} to review)")
+
+    def decide(self, accept):
+        '''
+        Accept or reject the selected answers for everyone who gave them (and anyone who gives them later)
+        '''
+        points = {}
+        for item in self.reviewList.selectedItems():
+            review = self.reviews[item.data(QtCore.Qt.UserRole)]
+            if review["decision"] == accept:
+                continue
+            # Undo an earlier accept, or grant a new one
+            change = 1 if accept else (-1 if review["decision"] else 0)
+            review["decision"] = accept
+            for email in review["users"]:
+                points[email] = points.get(email, 0) + change
+            self._describe(review)
+        points = {email: change for email,
+                  change in points.items() if change}
+        if points:
+            self.scoresModel.add_scores(points)
+        self._update_review_label()
+
+    def grading_done(self, result):
+        if self.progressBar.maximum() == 0:
+            # Nothing was graded, so the bar never left its busy state
+            self.progressBar.setRange(0, 1)
+        self.progressBar.setValue(self.progressBar.maximum())
+        self.progressBar.setFormat("Graded %m answers")
+
+    def closeEvent(self, event):
+        if self.task is not None:
+            self.task.cancel()
+        super(GradingDialog, self).closeEvent(event)
@@ -0,0 +1,91 @@
+import logging
+import time
+
+from PyQt5 import QtCore, QtWidgets
+
+from .grading_dialogs import ScoresTableModel
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LiveDialog(QtWidgets.QDialog):
+    '''
+    Follows the current quiz while it is live: new answers appear as they come in and scores go up as they are right
+    '''
+
+    # Older answers are dropped from the list past this many
+    MAX_ANSWERS_SHOWN = 1000
+
+    def __init__(self, scheduler, parent=None):
+        super(LiveDialog, self).__init__(parent)
+        self.scheduler = scheduler
+        self.task = None
+
+        self.setWindowTitle("Live quiz")
+        self.resize(900, 600)
+
+        self.quizLabel = QtWidgets.QLabel("Waiting for the current quiz...")
+        self.answersList = QtWidgets.QListWidget()
+
+        self.scoresModel = ScoresTableModel(self)
+        self.sortModel = QtCore.QSortFilterProxyModel(self)
+        self.sortModel.setSourceModel(self.scoresModel)
+        self.sortModel.setSortRole(QtCore.Qt.UserRole)
+        # Keep the leaders on top as scores change
+        self.sortModel.setDynamicSortFilter(True)
+        self.scoresView = QtWidgets.QTableView()
+        self.scoresView.setModel(self.sortModel)
+        self.scoresView.setSortingEnabled(True)
+        self.scoresView.sortByColumn(1, QtCore.Qt.DescendingOrder)
+        self.scoresView.horizontalHeader().setStretchLastSection(True)
+        self.scoresView.verticalHeader().hide()
+
+        splitter = QtWidgets.QSplitter()
+        splitter.addWidget(self.answersList)
+        splitter.addWidget(self.scoresView)
+
+        self.statusLabel = QtWidgets.QLabel()
+
+        mainLayout = QtWidgets.QVBoxLayout()
+        mainLayout.addWidget(self.quizLabel)
+        mainLayout.addWidget(splitter)
+        mainLayout.addWidget(self.statusLabel)
+        self.setLayout(mainLayout)
+
+    def attach(self, task):
+        '''
+        Show the events a watching task reports
+        '''
+        self.task = task
+        task.signals.progress.connect(self.add_events)
+        task.signals.error.connect(
+            lambda e: self.statusLabel.setText(f"Watching failed: {e}"))
+        task.signals.cancelled.connect(
+            lambda: self.statusLabel.setText("Stopped watching"))
+
+    def add_events(self, events):
+        scores = {}
+        for event in events:
+            if event["type"] == "quiz":
+                self.quizLabel.setText(f"Quiz #{event['quiz_number']}")
+                self.answersList.clear()
+                self.scoresModel.clear()
+                scores = {}
+            elif event["type"] == "answer":
+                mark = "right" if event["correct"] else "wrong"
+                self.answersList.insertItem(
+                    0, f"{event['email']} ({mark}): {event['answer']}\n    {event['question']}")
+            elif event["type"] == "score":
+                scores[event["email"]] = scores.get(
+                    event["email"], 0) + event["change"]
+        while self.answersList.count() > self.MAX_ANSWERS_SHOWN:
+            self.answersList.takeItem(self.answersList.count() - 1)
+        if scores:
+            self.scoresModel.add_scores(scores)
+        self.statusLabel.setText(
+            f"{self.answersList.count()} answers shown; last checked {time.strftime('%H:%M:%S')}")
+
+    def closeEvent(self, event):
+        if self.task is not None:
+            self.scheduler.cancel(self.task)
+        super(LiveDialog, self).closeEvent(event)
@@ -0,0 +1,144 @@
+import logging
+import threading
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import pyqtSignal
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_THREADS = 4
+
+
+class TaskCancelled(Exception):
+    '''
+    Raised inside a task that noticed it was cancelled
+    '''
+
+
+class TaskSignals(QtCore.QObject):
+    # QRunnable is not a QObject, so its signals live here
+    started = pyqtSignal()
+    progress = pyqtSignal(object)
+    output = pyqtSignal(object)
+    error = pyqtSignal(object)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class Task(QtCore.QRunnable):
+    '''
+    A unit of background work for a TaskScheduler. Subclasses override _run, which may call report_progress and check_cancelled
+    '''
+
+    def __init__(self, description):
+        super(Task, self).__init__()
+        # The scheduler keeps tasks alive until they finish
+        self.setAutoDelete(False)
+        self.description = description
+        self.signals = TaskSignals()
+        self._cancel_event = threading.Event()
+
+    def _run(self):
+        # Override me
+        LOGGER.info("No action to take")
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise TaskCancelled()
+
+    def report_progress(self, progress):
+        self.signals.progress.emit(progress)
+
+    def run(self):
+        try:
+            self.check_cancelled()
+            self.signals.started.emit()
+            result = self._run()
+            self.check_cancelled()
+        except TaskCancelled:
+            LOGGER.info(f"Cancelled: {self.description}")
+            self.signals.cancelled.emit()
+        except Exception as e:
+            LOGGER.exception(f"Failed: {self.description}")
+            self.signals.error.emit(e)
+        else:
+            self.signals.output.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class FunctionTask(Task):
+    '''
+    A task that calls f(*args, **kwargs)
+    '''
+
+    def __init__(self, description, f, *args, **kwargs):
+        super(FunctionTask, self).__init__(description)
+        self.f = f
+        self.args = args
+        self.kwargs = kwargs
+
+    def _run(self):
+        return self.f(*self.args, **self.kwargs)
+
+
+class TaskScheduler(QtCore.QObject):
+    '''
+    Runs tasks on a shared QThreadPool. Tasks beyond the pool's size wait in its queue; queued tasks can be cancelled outright and running ones are asked to stop
+    '''
+
+    tasks_changed = pyqtSignal(list)
+
+    def __init__(self, parent=None, max_threads=MAX_THREADS):
+        super(TaskScheduler, self).__init__(parent)
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._tasks = []
+
+    def submit(self, task):
+        '''
+        Queue a task and return it, so callers can connect to its signals
+        '''
+        self._tasks.append(task)
+        task.signals.finished.connect(lambda: self._forget(task))
+        self.pool.start(task)
+        self.tasks_changed.emit(self.descriptions())
+        return task
+
+    def run(self, description, f, *args, **kwargs):
+        '''
+        Queue a call to f(*args, **kwargs) and return its task
+        '''
+        return self.submit(FunctionTask(description, f, *args, **kwargs))
+
+    def cancel(self, task):
+        if self.pool.tryTake(task):
+            # It never started, so nothing else will clean up after it
+            task.cancel()
+            task.signals.cancelled.emit()
+            task.signals.finished.emit()
+        else:
+            task.cancel()
+
+    def cancel_all(self):
+        for task in list(self._tasks):
+            self.cancel(task)
+
+    def descriptions(self):
+        return [task.description for task in self._tasks]
+
+    def active_count(self):
+        return len(self._tasks)
+
+    def _forget(self, task):
+        try:
+            self._tasks.remove(task)
+        except ValueError:
+            return
+        self.tasks_changed.emit(self.descriptions())
@@ -0,0 +1,158 @@
+import json
+import threading
+from bisect import bisect_left
+
+# Upper bounds, in seconds, of the latency histogram's buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _EndpointMetrics:
+
+    __slots__ = ("requests", "errors", "retries", "coalesced", "throttled_sum", "bytes_sent",
+                 "bytes_received", "latency_sum", "latency_buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.throttled_sum = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        # The last bucket counts everything above the largest bound
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+class Metrics:
+    '''
+    Counters for API calls (per endpoint) and the user cache. Safe to update from several threads. A user found in the cache counts as a hit only the first time since the last reset, however many steps look it up; every fetch of a user counts as a miss
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self.user_cache_hits = 0
+            self.user_cache_misses = 0
+            self._looked_up = set()
+
+    def _endpoint(self, url_type):
+        try:
+            return self._endpoints[url_type]
+        except KeyError:
+            endpoint = self._endpoints[url_type] = _EndpointMetrics()
+            return endpoint
+
+    def record_request(self, url_type, seconds, bytes_sent=0, bytes_received=0, error=False):
+        '''
+        Record one HTTP request to an endpoint, successful or not
+        '''
+        with self._lock:
+            endpoint = self._endpoint(url_type)
+            endpoint.requests += 1
+            endpoint.errors += error
+            endpoint.bytes_sent += bytes_sent
+            endpoint.bytes_received += bytes_received
+            endpoint.latency_sum += seconds
+            endpoint.latency_buckets[bisect_left(
+                LATENCY_BUCKETS, seconds)] += 1
+
+    def record_retry(self, url_type):
+        with self._lock:
+            self._endpoint(url_type).retries += 1
+
+    def record_coalesced(self, url_type):
+        '''
+        Record a request that shared the response of an identical one instead of being sent
+        '''
+        with self._lock:
+            self._endpoint(url_type).coalesced += 1
+
+    def record_throttle(self, url_type, seconds):
+        with self._lock:
+            self._endpoint(url_type).throttled_sum += seconds
+
+    def record_user_lookups(self, hits=(), misses=()):
+        '''
+        Record the IDs of users found in the cache and of users that had to be fetched
+        '''
+        with self._lock:
+            looked_up = self._looked_up
+            for user_id in hits:
+                if user_id not in looked_up:
+                    looked_up.add(user_id)
+                    self.user_cache_hits += 1
+            for user_id in misses:
+                looked_up.add(user_id)
+                self.user_cache_misses += 1
+
+    def snapshot(self):
+        '''
+        Return everything recorded so far as a dict
+        '''
+        with self._lock:
+            lookups = self.user_cache_hits + self.user_cache_misses
+            return {
+                "endpoints": {url_type: {
+                    "requests": endpoint.requests,
+                    "errors": endpoint.errors,
+                    "retries": endpoint.retries,
+                    "coalesced": endpoint.coalesced,
+                    "throttled_seconds_sum": endpoint.throttled_sum,
+                    "bytes_sent": endpoint.bytes_sent,
+                    "bytes_received": endpoint.bytes_received,
+                    "latency_seconds_sum": endpoint.latency_sum,
+                    "latency_seconds_buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], endpoint.latency_buckets))
+                } for url_type, endpoint in self._endpoints.items()},
+                "user_cache": {
+                    "hits": self.user_cache_hits,
+                    "misses": self.user_cache_misses,
+                    "hit_ratio": self.user_cache_hits / lookups if lookups else None
+                }
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=4)
+
+    def to_prometheus(self):
+        '''
+        Return everything recorded so far in the Prometheus text exposition format
+        '''
+        snapshot = self.snapshot()
+        lines = []
+        for name, kind, key in (("gfm_api_requests_total", "counter", "requests"),
+                                ("gfm_api_errors_total", "counter", "errors"),
+                                ("gfm_api_retries_total", "counter", "retries"),
+                                ("gfm_api_coalesced_total", "counter", "coalesced"),
+                                ("gfm_api_throttled_seconds_total", "counter", "throttled_seconds_sum"),
+                                ("gfm_api_sent_bytes_total", "counter", "bytes_sent"),
+                                ("gfm_api_received_bytes_total", "counter", "bytes_received")):
+            lines.append("# TYPE {} {}".format(name, kind))
+            for url_type, endpoint in snapshot["endpoints"].items():
+                lines.append('{}{{endpoint="{}"}} {}'.format(
+                    name, url_type, endpoint[key]))
+        lines.append("# TYPE gfm_api_latency_seconds histogram")
+        for url_type, endpoint in snapshot["endpoints"].items():
+            cumulative = 0
+            for bound, count in endpoint["latency_seconds_buckets"].items():
+                cumulative += count
+                lines.append('gfm_api_latency_seconds_bucket{{endpoint="{}",le="{}"}} {}'.format(
+                    url_type, bound, cumulative))
+            lines.append('gfm_api_latency_seconds_sum{{endpoint="{}"}} {}'.format(
+                url_type, endpoint["latency_seconds_sum"]))
+            lines.append('gfm_api_latency_seconds_count{{endpoint="{}"}} {}'.format(
+                url_type, endpoint["requests"]))
+        lines.append("# TYPE gfm_user_cache_hits_total counter")
+        lines.append("gfm_user_cache_hits_total {}".format(
+            snapshot["user_cache"]["hits"]))
+        lines.append("# TYPE gfm_user_cache_misses_total counter")
+        lines.append("gfm_user_cache_misses_total {}".format(
+            snapshot["user_cache"]["misses"]))
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
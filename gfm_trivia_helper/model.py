@@ -0,0 +1,190 @@
+import logging
+from array import array
+
+from .common import _append_answer_id, resolve_emails
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Question:
+    '''
+    A quiz question and its answer key
+    '''
+
+    __slots__ = ("text", "answers", "type")
+
+    def __init__(self, text, answers, type=0):
+        self.text = text
+        self.answers = tuple(answers)
+        self.type = type
+
+    @classmethod
+    def from_json(cls, question):
+        return cls(question["questionText"], question["questionAnswer"]["answer"], question["questionAnswer"]["type"])
+
+    def to_json(self):
+        return {
+            "questionText": self.text,
+            "questionAnswer": {
+                "answer": list(self.answers),
+                "type": self.type
+            }
+        }
+
+    def __repr__(self):
+        return "Question({!r}, {!r}, {!r})".format(self.text, self.answers, self.type)
+
+
+class Answer:
+    '''
+    One user's answer to a question
+    '''
+
+    __slots__ = ("answer_id", "user_id", "text")
+
+    def __init__(self, answer_id, user_id, text):
+        self.answer_id = answer_id
+        self.user_id = user_id
+        self.text = text
+
+    @classmethod
+    def from_json(cls, answer):
+        return cls(answer["answerID"], answer["userID"], answer["answerText"])
+
+    def to_json(self):
+        return {"userID": self.user_id, "answerID": self.answer_id, "answerText": self.text}
+
+    def __repr__(self):
+        return "Answer({!r}, {!r}, {!r})".format(self.answer_id, self.user_id, self.text)
+
+
+class QuizAnswers:
+    '''
+    A quiz's answers, compactly: each answer is a row in array columns of answer IDs (a list instead if any ID is not an integer) and question and user indexes, users are stored once, and repeated answer texts share one string. Rows are kept in question order, as in the API's payload. Can be passed as answers data anywhere a payload can; it iterates as (question, answer) records
+    '''
+
+    __slots__ = ("quiz_number", "questions", "user_ids", "emails", "answer_ids",
+                 "question_col", "user_col", "texts", "_user_index", "_text_index")
+
+    def __init__(self, quiz_number=None, questions=None):
+        self.quiz_number = quiz_number
+        self.questions = [] if questions is None else list(questions)
+        self.user_ids = []
+        # Filled in by resolve_users, in the same order as user_ids
+        self.emails = None
+        self.answer_ids = array("q")
+        self.question_col = array("l")
+        self.user_col = array("l")
+        self.texts = []
+        self._user_index = {}
+        self._text_index = {}
+
+    @classmethod
+    def from_json(cls, answers_data):
+        '''
+        Build from an ANSWERS payload, or from any answers data (such as a stream) if its records are in question order
+        '''
+        if not isinstance(answers_data, dict):
+            return cls._from_records(answers_data)
+        quiz = cls(answers_data["quizNumber"])
+        for question in answers_data["questions"]:
+            quiz.questions.append(Question.from_json(question))
+            question_num = len(quiz.questions) - 1
+            for answer in question["userAnswers"]:
+                quiz.append(question_num, answer["userID"],
+                            answer["answerID"], answer["answerText"])
+        return quiz
+
+    @classmethod
+    def _from_records(cls, records):
+        quiz = cls()
+        current_question = None
+        for question, answer in records:
+            if question is not current_question:
+                current_question = question
+                quiz.questions.append(Question.from_json(question))
+            if answer is not None:
+                quiz.append(len(quiz.questions) - 1, answer["userID"],
+                            answer["answerID"], answer["answerText"])
+        quiz.quiz_number = getattr(records, "quiz_number", None)
+        return quiz
+
+    def to_json(self):
+        '''
+        Return the quiz as an ANSWERS payload
+        '''
+        questions = [dict(question.to_json(), userAnswers=[])
+                     for question in self.questions]
+        for row in range(len(self)):
+            questions[self.question_col[row]]["userAnswers"].append(
+                self.answer(row).to_json())
+        return {"quizNumber": self.quiz_number, "questions": questions}
+
+    def append(self, question_num, user_id, answer_id, text):
+        '''
+        Add an answer to the question at question_num. Answers must be added in question order
+        '''
+        user_num = self._user_index.get(user_id)
+        if user_num is None:
+            user_num = self._user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            if self.emails is not None:
+                # Not resolved yet
+                self.emails.append(None)
+        self.answer_ids = _append_answer_id(self.answer_ids, answer_id)
+        self.question_col.append(question_num)
+        self.user_col.append(user_num)
+        self.texts.append(self._text_index.setdefault(text, text))
+
+    def __len__(self):
+        return len(self.answer_ids)
+
+    def answer(self, row):
+        return Answer(self.answer_ids[row], self.user_ids[self.user_col[row]], self.texts[row])
+
+    def resolve_users(self, user_data, secret):
+        '''
+        Look up every user not yet in user_data (all at once) and keep their emails
+        '''
+        if self.emails is not None and None not in self.emails:
+            return
+        emails = resolve_emails(user_data, self.user_ids, secret)
+        self.emails = [emails[user_id] for user_id in self.user_ids]
+
+    def email(self, row):
+        '''
+        Return the email of the user who gave the answer at row. Needs resolve_users
+        '''
+        return self.emails[self.user_col[row]]
+
+    def row(self, row):
+        '''
+        Return the answer at row as (user, question, answer, answer_id), as export writers take them. Needs resolve_users
+        '''
+        return (self.emails[self.user_col[row]], self.questions[self.question_col[row]].text, self.texts[row], self.answer_ids[row])
+
+    def _iter_records(self, emails):
+        questions = [question.to_json() for question in self.questions]
+        next_question = 0
+        for row in range(len(self)):
+            question_num = self.question_col[row]
+            if question_num >= next_question:
+                # Questions nobody answered come between the ones that were
+                for question in questions[next_question:question_num]:
+                    yield question, None, None
+                next_question = question_num + 1
+            user_num = self.user_col[row]
+            yield questions[question_num], {"userID": self.user_ids[user_num], "answerID": self.answer_ids[row], "answerText": self.texts[row]}, None if emails is None else emails[user_num]
+        for question in questions[next_question:]:
+            yield question, None, None
+
+    def __iter__(self):
+        for question, answer, _ in self._iter_records(None):
+            yield question, answer
+
+    def iter_records_with_emails(self, user_data, secret):
+        '''
+        Yield (question, answer, email) records, resolving users first
+        '''
+        self.resolve_users(user_data, secret)
+        yield from self._iter_records(self.emails)
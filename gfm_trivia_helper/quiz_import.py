@@ -0,0 +1,185 @@
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import QUESTION_TYPES, create_quiz
+
+LOGGER = logging.getLogger(__name__)
+
+CREATE_CONCURRENCY = 4
+# Separates a question's answers in a CSV's answer column
+CSV_ANSWER_SEPARATOR = "|"
+
+_TYPES_BY_NAME = {name: type_num for type_num, name in QUESTION_TYPES.items()}
+
+
+class QuizFileError(ValueError):
+    '''
+    A quiz file could not be read, or a question in it is not valid
+    '''
+
+    def __init__(self, filename, where, message):
+        self.filename = filename
+        self.where = where
+        self.message = message
+        super(QuizFileError, self).__init__(
+            "{} ({}): {}".format(filename, where, message))
+
+
+def validate_question(question, filename="<questions>", where="question"):
+    '''
+    Check a question (in the same shape create_quiz takes, or with "question", "answers" and "type" keys as in a CSV) and return it in the shape create_quiz takes
+    '''
+    if not isinstance(question, dict):
+        raise QuizFileError(filename, where, "not a question")
+    question_text = question.get(
+        "questionText", question.get("question"))
+    if isinstance(question.get("questionAnswer"), dict):
+        answers = question["questionAnswer"].get("answer")
+        question_type = question["questionAnswer"].get("type", 0)
+    else:
+        answers = question.get("answers", question.get("answer"))
+        question_type = question.get("type", 0)
+    if not isinstance(question_text, str) or not question_text.strip():
+        raise QuizFileError(filename, where, "missing question text")
+    if isinstance(answers, str):
+        answers = [answers]
+    if not isinstance(answers, list) or not answers:
+        raise QuizFileError(filename, where, "missing answers")
+    if not all(isinstance(answer, str) and answer.strip() for answer in answers):
+        raise QuizFileError(filename, where, "answers must be non-empty text")
+    if isinstance(question_type, str):
+        try:
+            question_type = int(question_type) if question_type.isdigit(
+            ) else _TYPES_BY_NAME[question_type.strip().upper() or "AND"]
+        except KeyError:
+            raise QuizFileError(filename, where, "type must be one of {}".format(
+                ", ".join(_TYPES_BY_NAME))) from None
+    if question_type not in QUESTION_TYPES:
+        raise QuizFileError(filename, where, "type must be one of {}".format(
+            ", ".join(_TYPES_BY_NAME)))
+    return {
+        "questionText": question_text,
+        "questionAnswer": {
+            "answer": answers,
+            # Same rule as when questions are typed in: one answer leaves nothing to choose between
+            "type": question_type if len(answers) != 1 else 0
+        }
+    }
+
+
+def _iter_csv(filename):
+    '''
+    Yield (quiz key, where, question) from a CSV with question, answers and (optionally) type and quiz columns, one question per row
+    '''
+    with open(filename, newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            row = {key.strip().lower(): value for key,
+                   value in row.items() if key is not None}
+            answers = [answer.strip() for answer in (
+                row.get("answers") or row.get("answer") or "").split(CSV_ANSWER_SEPARATOR)]
+            yield row.get("quiz") or None, "line {}".format(reader.line_num), {
+                "question": row.get("question"),
+                "answers": [answer for answer in answers if answer],
+                "type": row.get("type") or "AND"
+            }
+
+
+def _iter_document(document):
+    '''
+    Yield (quiz key, where, question) from a parsed JSON or YAML document: either a list of questions, or a list of quizzes (each a list of questions or a dict with a "questions" list), optionally under a "quizzes" key
+    '''
+    if isinstance(document, dict) and "quizzes" in document:
+        document = document["quizzes"]
+    elif isinstance(document, dict) and "questions" in document:
+        document = [document]
+    if not isinstance(document, list):
+        raise ValueError("expected a list of questions or quizzes")
+    for quiz_num, item in enumerate(document):
+        if isinstance(item, dict) and "questions" in item:
+            questions = item["questions"]
+        elif isinstance(item, list):
+            questions = item
+        else:
+            yield None, "question {}".format(quiz_num + 1), item
+            continue
+        for question_num, question in enumerate(questions):
+            yield quiz_num, "quiz {}, question {}".format(quiz_num + 1, question_num + 1), question
+
+
+def _iter_file(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        yield from _iter_csv(filename)
+        return
+    with open(filename) as f:
+        if extension == ".json":
+            document = json.load(f)
+        elif extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise QuizFileError(
+                    filename, "file", "PyYAML is required to read YAML files") from None
+            document = yaml.safe_load(f)
+        else:
+            raise QuizFileError(
+                filename, "file", "unknown format; use .csv, .json, .yaml or .yml")
+    try:
+        yield from _iter_document(document)
+    except ValueError as e:
+        raise QuizFileError(filename, "file", str(e)) from None
+
+
+def load_quizzes(filenames, questions_per_quiz=None):
+    '''
+    Read and validate questions from CSV, JSON or YAML files and return them grouped into quizzes, each a list of questions ready for create_quiz. Questions that a file does not assign to a quiz are put into quizzes of questions_per_quiz (one quiz per file if None). All problems are collected and raised together
+    '''
+    quizzes = []
+    errors = []
+    for filename in filenames:
+        grouped = {}
+        loose = []
+        try:
+            for quiz_key, where, question in _iter_file(filename):
+                try:
+                    question = validate_question(question, filename, where)
+                except QuizFileError as e:
+                    errors.append(e)
+                    continue
+                if quiz_key is None:
+                    loose.append(question)
+                else:
+                    grouped.setdefault(quiz_key, []).append(question)
+        except (OSError, ValueError) as e:
+            errors.append(e)
+            continue
+        quizzes.extend(grouped.values())
+        if loose:
+            size = questions_per_quiz or len(loose)
+            quizzes.extend(loose[i:i + size]
+                           for i in range(0, len(loose), size))
+    if errors:
+        raise ValueError("Invalid quiz files:\n" +
+                         "\n".join(str(e) for e in errors))
+    return quizzes
+
+
+def create_quizzes(secret, quizzes, max_workers=CREATE_CONCURRENCY):
+    '''
+    Create several quizzes, up to max_workers at a time, and return a list with each quiz's number or the exception that creating it raised, in the same order as quizzes
+    '''
+    def create(questions_data):
+        try:
+            return create_quiz(secret, questions_data)
+        except Exception as e:
+            LOGGER.debug("Creating a quiz failed: {}".format(e))
+            return e
+
+    if not quizzes:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(quizzes)))) as executor:
+        return list(executor.map(create, quizzes))
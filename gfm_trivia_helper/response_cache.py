@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from time import time
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = 60
+# A closed quiz's answers should not change, but a quiz can be reopened, so even those are fetched again eventually
+CLOSED_MAX_AGE = 7 * 24 * 60 * 60
+
+
+class ResponseCache:
+    '''
+    An on-disk cache of API responses keyed by endpoint and payload. Responses are fresh for max_age seconds, except responses stored as closed (for a quiz that was confirmed not to be live when it was fetched), which are fresh for closed_max_age seconds. Use for_site to keep each site's responses apart
+    '''
+
+    def __init__(self, folder, max_age=DEFAULT_MAX_AGE, closed_max_age=CLOSED_MAX_AGE):
+        self.folder = folder
+        self.max_age = max_age
+        self.closed_max_age = closed_max_age
+        self._current_quiz = None
+        self._current_quiz_known = False
+        self._sites = {}
+
+    def for_site(self, url):
+        '''
+        Return the cache for the site at url, in a folder of its own under this one, so that sites (such as test mode and live) never share responses. It has this cache's max ages
+        '''
+        site = self._sites.get(url)
+        if site is None:
+            site = self._sites[url] = ResponseCache(os.path.join(
+                self.folder, hashlib.sha1(url.encode()).hexdigest()[:16]))
+        site.max_age = self.max_age
+        site.closed_max_age = self.closed_max_age
+        return site
+
+    @staticmethod
+    def _key(url_type, payload):
+        return hashlib.sha1(json.dumps([url_type, payload], sort_keys=True).encode()).hexdigest()
+
+    def _filename(self, url_type, payload):
+        return os.path.join(self.folder, "{}-{}.json".format(url_type.lower(), self._key(url_type, payload)))
+
+    def _write(self, filename, data):
+        os.makedirs(self.folder, exist_ok=True)
+        # A temporary file of its own, so that writers of the same entry at the same time cannot trip over each other
+        fd, temp_filename = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_filename, filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+    def _load_current_quiz(self):
+        if not self._current_quiz_known:
+            try:
+                with open(os.path.join(self.folder, "current.json")) as f:
+                    self._current_quiz = json.load(f)["quizNumber"]
+                self._current_quiz_known = True
+            except FileNotFoundError:
+                pass
+        return self._current_quiz_known
+
+    def set_current_quiz(self, quiz_number):
+        '''
+        Record which quiz is live (None if none is) and drop anything cached for it. If that changed, what was cached for the current quiz (by number or not) is dropped too, since it was stored while that quiz was still open
+        '''
+        previous_known = self._load_current_quiz()
+        previous = self._current_quiz
+        self._current_quiz = quiz_number
+        self._current_quiz_known = True
+        self._write(os.path.join(self.folder, "current.json"),
+                    {"quizNumber": quiz_number})
+        if not previous_known or previous != quiz_number:
+            self.invalidate("ANSWERS", {"quizNumber": None})
+            if previous is not None:
+                self.invalidate("ANSWERS", {"quizNumber": previous})
+        if quiz_number is not None:
+            self.invalidate("ANSWERS", {"quizNumber": quiz_number})
+
+    def get(self, url_type, payload, max_age=None):
+        '''
+        Return the cached response, or None if there is no fresh one
+        '''
+        filename = self._filename(url_type, payload)
+        try:
+            with open(filename) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if max_age is None:
+            max_age = self.max_age
+        if entry.get("closed"):
+            max_age = max(max_age, self.closed_max_age)
+        if time() - entry["stored"] > max_age:
+            LOGGER.debug("Cached {} response for {} is stale".format(
+                url_type, payload))
+            return None
+        return entry["response"]
+
+    def put(self, url_type, payload, response, closed=False):
+        '''
+        Store a response. closed says whether its quiz was confirmed to be closed before it was requested
+        '''
+        self._write(self._filename(url_type, payload),
+                    {"stored": time(), "closed": closed, "response": response})
+
+    def invalidate(self, url_type, payload):
+        try:
+            os.remove(self._filename(url_type, payload))
+        except FileNotFoundError:
+            pass
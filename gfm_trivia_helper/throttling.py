@@ -0,0 +1,78 @@
+import threading
+from time import monotonic, sleep
+
+
+class TokenBucket:
+    '''
+    Allows rate calls a second on average, with bursts of up to capacity calls. Safe to share between threads; waiting callers are let through in the order they arrived
+    '''
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Take a token, waiting until there is one, and return how many seconds were waited
+        '''
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.capacity, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            # Going into debt reserves the next token, so later callers queue up behind this one
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            sleep(wait)
+        return wait
+
+
+class _Call:
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    '''
+    Makes concurrent calls with the same key share one call: the first runs, the rest wait for it and get its result (the same object) or its exception. Nothing is remembered once a call is over
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, f):
+        '''
+        Return (f() or the result of the call for key already in flight, whether it was shared)
+        '''
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = f()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
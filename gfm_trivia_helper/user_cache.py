@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from time import time
+
+from .common import RESULTS_FOLDER
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 50000
+
+
+class UserCache(MutableMapping):
+    '''
+    A persistent, dict-like store of users' data backed by SQLite. Entries expire after ttl seconds and the least recently used entries are evicted once there are more than max_entries of them. Reads do not write: when entries were last used is kept in memory until the next write, flush or close
+    '''
+
+    def __init__(self, filename, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.filename = filename
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._on_invalidate = []
+        # Keys read since the last flush, and when
+        self._accessed = {}
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, data TEXT NOT NULL, stored REAL NOT NULL, accessed REAL NOT NULL)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS users_accessed ON users (accessed)")
+
+    @staticmethod
+    def _key(user_id):
+        # The API hands back IDs as either ints or strings; store them the same way
+        return json.dumps(user_id)
+
+    def __getitem__(self, user_id):
+        key = self._key(user_id)
+        now = time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, stored FROM users WHERE user_id = ?", (key,)).fetchone()
+            if row is None:
+                raise KeyError(user_id)
+            if self.ttl is not None and now - row[1] > self.ttl:
+                LOGGER.debug("Cached user {} expired".format(user_id))
+                self._delete(key)
+                raise KeyError(user_id)
+            self._accessed[key] = now
+        return json.loads(row[0])
+
+    def __setitem__(self, user_id, data):
+        now = time()
+        key = self._key(user_id)
+        with self._lock, self._conn:
+            self._accessed.pop(key, None)
+            self._conn.execute("INSERT OR REPLACE INTO users (user_id, data, stored, accessed) VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(data), now, now))
+            self._evict()
+
+    def update(self, other=(), **kwargs):
+        '''
+        Store many users in a single transaction
+        '''
+        items = list(other.items() if hasattr(other, "items") else other)
+        items.extend(kwargs.items())
+        now = time()
+        rows = [(self._key(user_id), json.dumps(data), now, now)
+                for user_id, data in items]
+        with self._lock, self._conn:
+            for row in rows:
+                self._accessed.pop(row[0], None)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO users (user_id, data, stored, accessed) VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+
+    def __delitem__(self, user_id):
+        with self._lock:
+            if not self._delete(self._key(user_id)):
+                raise KeyError(user_id)
+
+    def __iter__(self):
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT user_id FROM users")]
+        return (json.loads(key) for key in keys)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def __contains__(self, user_id):
+        # Only a check, so neither a use nor a reason to drop an expired entry yet
+        oldest = float("-inf") if self.ttl is None else time() - self.ttl
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM users WHERE user_id = ? AND stored >= ?", (self._key(user_id), oldest)).fetchone() is not None
+
+    def _flush_accessed(self):
+        if self._accessed:
+            self._conn.executemany("UPDATE users SET accessed = ? WHERE user_id = ?", (
+                (accessed, key) for key, accessed in self._accessed.items()))
+            self._accessed = {}
+
+    def flush(self):
+        '''
+        Write when entries were last used to the database
+        '''
+        with self._lock, self._conn:
+            self._flush_accessed()
+
+    def _delete(self, key):
+        self._accessed.pop(key, None)
+        with self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM users WHERE user_id = ?", (key,)).rowcount
+        if deleted:
+            for callback in self._on_invalidate:
+                callback(json.loads(key))
+        return deleted
+
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        # Eviction goes by when entries were last used, so that has to be up to date first
+        self._flush_accessed()
+        self._conn.execute(
+            "DELETE FROM users WHERE user_id IN (SELECT user_id FROM users ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def add_invalidation_hook(self, callback):
+        '''
+        Call callback with a user's ID whenever that user is invalidated or expires
+        '''
+        self._on_invalidate.append(callback)
+
+    def invalidate(self, user_id=None):
+        '''
+        Forget a single user, or every user if user_id is None
+        '''
+        with self._lock:
+            if user_id is not None:
+                self._delete(self._key(user_id))
+                return
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT user_id FROM users")]
+            self._accessed = {}
+            with self._conn:
+                self._conn.execute("DELETE FROM users")
+        for key in keys:
+            for callback in self._on_invalidate:
+                callback(json.loads(key))
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+
+def open_user_cache(secret, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+    '''
+    Open the user cache in the results folder for the site secret points to. Each site (such as test mode and live) has its own, as their user IDs are unrelated
+    '''
+    site = hashlib.sha1(secret.urls["USER"].encode()).hexdigest()[:16]
+    return UserCache(os.path.join(RESULTS_FOLDER, "users-{}.sqlite3".format(site)), ttl=ttl, max_entries=max_entries)
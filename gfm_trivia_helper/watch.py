@@ -0,0 +1,114 @@
+import logging
+import threading
+
+from .common import AnswerMatcher, post, resolve_emails
+from .fuzzy import FuzzyMatcher
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds between polls: quicker while answers are coming in, slower while they are not
+MIN_INTERVAL = 2
+MAX_INTERVAL = 30
+INTERVAL_GROWTH = 1.5
+
+
+class QuizWatcher:
+    '''
+    Polls the current quiz and reports what changed since the last poll as a list of event dicts: {"type": "quiz", "quiz_number"} when a different quiz is live (including on the first poll), {"type": "answer", "quiz_number", "question", "email", "answer", "answer_id", "correct"} for each answer not seen before, and {"type": "score", "email", "score", "change"} for each user whose score went up. Only users not seen before are looked up. Answers are matched like grading does (with near misses too, given a fuzzy_threshold), without asking about anything
+    '''
+
+    def __init__(self, secret, user_data, fuzzy_threshold=None, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.secret = secret
+        self.user_data = user_data
+        self.fuzzy_threshold = fuzzy_threshold
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.quiz_number = None
+        self.scores = {}
+        self._seen = set()
+        self._emails = {}
+        self._matchers = {}
+        self._verdicts = {}
+
+    def _reset(self, quiz_number):
+        self.quiz_number = quiz_number
+        self.scores = {}
+        self._seen = set()
+        self._matchers = {}
+        self._verdicts = {}
+
+    def _is_correct(self, question, answer_text):
+        key = (question["questionText"], answer_text)
+        correct = self._verdicts.get(key)
+        if correct is None:
+            matchers = self._matchers.get(question["questionText"])
+            if matchers is None:
+                matcher = AnswerMatcher(question["questionAnswer"])
+                matchers = self._matchers[question["questionText"]] = (matcher, None if self.fuzzy_threshold is None else FuzzyMatcher(
+                    matcher, self.fuzzy_threshold))
+            correct = answer_text != "" and (matchers[0].match(answer_text) or (
+                matchers[1] is not None and matchers[1].match(answer_text)))
+            self._verdicts[key] = correct
+        return correct
+
+    def diff(self, answers_data):
+        '''
+        Return the events for a fresh ANSWERS payload of the current quiz, and remember it as seen
+        '''
+        events = []
+        if answers_data["quizNumber"] != self.quiz_number:
+            self._reset(answers_data["quizNumber"])
+            events.append(
+                {"type": "quiz", "quiz_number": self.quiz_number})
+        new_answers = [(question, answer) for question in answers_data["questions"]
+                       for answer in question["userAnswers"] if answer["answerID"] not in self._seen]
+        new_users = {answer["userID"] for _, answer in new_answers} - \
+            self._emails.keys()
+        if new_users:
+            self._emails.update(resolve_emails(
+                self.user_data, new_users, self.secret))
+        changes = {}
+        for question, answer in new_answers:
+            self._seen.add(answer["answerID"])
+            email = self._emails[answer["userID"]]
+            correct = self._is_correct(question, answer["answerText"])
+            events.append({"type": "answer", "quiz_number": self.quiz_number, "question": question["questionText"], "email": email,
+                           "answer": answer["answerText"], "answer_id": answer["answerID"], "correct": correct})
+            if correct:
+                changes[email] = changes.get(email, 0) + 1
+        for email, change in changes.items():
+            self.scores[email] = self.scores.get(email, 0) + change
+            events.append({"type": "score", "email": email,
+                           "score": self.scores[email], "change": change})
+        return events
+
+    def poll(self):
+        '''
+        Fetch the current quiz and return what changed, adjusting the interval to wait before the next poll
+        '''
+        # Straight from the API: a live quiz is never fresh for long enough to be worth caching
+        events = self.diff(
+            post("ANSWERS", {"quizNumber": None}, self.secret))
+        if events:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval,
+                                self.interval * INTERVAL_GROWTH)
+        return events
+
+    def watch(self, stop=None):
+        '''
+        Poll until stop (a threading.Event) is set, yielding each poll's events (which may be none). A failed poll is logged and waited out at the longest interval
+        '''
+        if stop is None:
+            stop = threading.Event()
+        while not stop.is_set():
+            try:
+                events = self.poll()
+            except Exception as e:
+                LOGGER.warning("Polling the current quiz failed: {}".format(e))
+                self.interval = self.max_interval
+            else:
+                yield events
+            stop.wait(self.interval)
@@ -22,6 +22,12 @@ setuptools.setup(
         "requests",
         "zmtools"
     ],
+    extras_require={
+        "streaming": ["ijson>=3.1"],
+        "fast": ["numpy"],
+        "export": ["pyarrow", "zstandard"],
+        "yaml": ["PyYAML"]
+    },
     entry_points={
         'console_scripts': [
             'gfm-trivia-helper = gfm_trivia_helper.cli:main',
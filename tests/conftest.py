@@ -0,0 +1,51 @@
+import os
+import sys
+import types
+
+import pytest
+
+# The mock API lives with the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from mock_api import FakeSecretStuff, MockQuizAPI, make_answers_data  # noqa: E402
+
+
+@pytest.fixture
+def api():
+    '''
+    A mock API with quiz 1 (15 users) and quiz 2 (30 users, including quiz 1's)
+    '''
+    with MockQuizAPI({1: make_answers_data(300, quiz_number=1, seed=1),
+                      2: make_answers_data(600, quiz_number=2, seed=2)}) as api:
+        yield api
+
+
+@pytest.fixture
+def secret(api):
+    return FakeSecretStuff(api.base_url)
+
+
+@pytest.fixture
+def run_cli(api, tmp_path, monkeypatch):
+    '''
+    Return a function that runs the command line against the mock API with its arguments, keeping every file under tmp_path
+    '''
+    from gfm_trivia_helper import cli, common
+    from gfm_trivia_helper.user_cache import UserCache
+
+    # The real SecretStuff is not distributed
+    secretstuff = types.ModuleType("gfm_trivia_helper.secretstuff")
+    secretstuff.SecretStuff = lambda test_mode=False: FakeSecretStuff(
+        api.base_url)
+    monkeypatch.setitem(sys.modules, "gfm_trivia_helper.secretstuff", secretstuff)
+    monkeypatch.setattr(common, "ANSWERS_CACHE", None)
+    monkeypatch.setattr(common, "RATE_LIMITS", {})
+    monkeypatch.setattr(cli, "open_user_cache", lambda *args, **kwargs: UserCache(
+        str(tmp_path / "users.sqlite3")))
+
+    def run(*args):
+        monkeypatch.setattr(sys, "argv", ["gfm-trivia-helper"] + list(args))
+        return cli.main()
+
+    return run
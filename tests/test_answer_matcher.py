@@ -0,0 +1,94 @@
+'''
+AnswerMatcher must accept exactly the answers the original _compare_answer did.
+'''
+import json
+import random
+
+import pytest
+
+from gfm_trivia_helper.common import AnswerMatcher, _compare_answer
+
+
+def original_compare_answer(user_answer, actual_answer):
+    # _compare_answer as it was before AnswerMatcher, kept verbatim as the reference
+    s = [s.upper() for s in actual_answer["answer"]]
+    try:
+        modified_answer = json.loads(user_answer)
+        if isinstance(modified_answer, list):
+            modified_answer = [s.strip().upper() for s in modified_answer]
+        else:
+            # No good
+            modified_answer = [user_answer.upper()]
+    except json.decoder.JSONDecodeError:
+        # No good
+        modified_answer = [s.strip().upper() for s in user_answer.split(",")]
+        if len(modified_answer) == 1:
+            # No good
+            modified_answer = [user_answer.upper()]
+    if actual_answer["type"] == 0:
+        return modified_answer == s
+    elif actual_answer["type"] == 1:
+        return (all(x in s for x in modified_answer))
+
+
+KEYS = [
+    {"answer": ["Paris"], "type": 0},
+    {"answer": ["Red", "Blue"], "type": 0},
+    {"answer": ["Red", "Blue"], "type": 1},
+    {"answer": ["42"], "type": 1},
+    {"answer": ["a, b"], "type": 0},
+    {"answer": ["Paris"], "type": 2},
+    {"answer": [], "type": 0},
+    {"answer": [], "type": 1},
+]
+
+ANSWERS = [
+    # Single answers, with case and whitespace
+    "Paris", "paris", " PARIS ", "Pari", "", " ", "\t\n",
+    # Comma lists
+    "Red,Blue", "red, blue", " Red , Blue ", "Blue,Red", "Red,", ",", "Red,,Blue", "a, b", "a,b",
+    # JSON lists
+    '["Red", "Blue"]', '[" red ", "BLUE"]', '["Blue"]', "[]", '["Paris"]', ' \n["Red"]', '["a, b"]',
+    # JSON scalars
+    "42", "-1", "4.2e1", "true", "null", "NaN", "Infinity", '"Paris"', '"Red,Blue"', "{}", '{"a": 1}',
+    # Almost JSON
+    "[Red, Blue]", '["Red", "Blue"', "[", '"', "{Red}", "1,2", "[1,2", "true,false",
+]
+
+
+@pytest.mark.parametrize("actual_answer", KEYS)
+@pytest.mark.parametrize("user_answer", ANSWERS)
+def test_matches_original(user_answer, actual_answer):
+    expected = original_compare_answer(user_answer, actual_answer)
+    assert AnswerMatcher(actual_answer).match(user_answer) == expected
+    assert _compare_answer(user_answer, actual_answer) == expected
+
+
+@pytest.mark.parametrize("actual_answer", KEYS)
+@pytest.mark.parametrize("user_answer", ["[1, 2]", '["Red", 2]', "[null]", "[[\"Red\"]]"])
+def test_non_string_json_list_raises_like_original(user_answer, actual_answer):
+    with pytest.raises(AttributeError):
+        original_compare_answer(user_answer, actual_answer)
+    with pytest.raises(AttributeError):
+        AnswerMatcher(actual_answer).match(user_answer)
+
+
+def test_unknown_type_matches_nothing():
+    assert AnswerMatcher({"answer": ["Paris"], "type": 2}).match("Paris") is None
+
+
+def test_random_answers_match_original():
+    rng = random.Random(0)
+    pieces = ["Red", "blue", " BLUE ", "Paris", "42", ",", ", ", "[", "]", '"', "{", "}", " ", "\t", "null", "1"]
+    for _ in range(20000):
+        user_answer = "".join(rng.choice(pieces)
+                              for _ in range(rng.randint(0, 6)))
+        for actual_answer in KEYS:
+            try:
+                expected = original_compare_answer(user_answer, actual_answer)
+            except AttributeError:
+                with pytest.raises(AttributeError):
+                    AnswerMatcher(actual_answer).match(user_answer)
+                continue
+            assert AnswerMatcher(actual_answer).match(
+                user_answer) == expected, (user_answer, actual_answer)
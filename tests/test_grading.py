@@ -0,0 +1,125 @@
+'''
+Bulk grading must behave exactly like the original check_user_answers loop: the same prompts in the same order, the same scores in the same order, and the same winner.
+'''
+import builtins
+import json
+import operator
+import random
+
+import pytest
+
+from gfm_trivia_helper import common, grading
+from gfm_trivia_helper.common import QUESTION_TYPES, _compare_answer, _get_user_data, y_to_continue
+
+
+def original_check_user_answers(user_data, secret, answers_data):
+    # check_user_answers as it was before grading.grade_answers, kept as the reference
+    scores = {}
+    for question in answers_data["questions"]:
+        for answer in question["userAnswers"]:
+            user = _get_user_data(user_data, answer["userID"], secret)["email"]
+            if answer["answerText"] == "":
+                # Left blank means efinitely wrong
+                continue
+            match = _compare_answer(
+                answer["answerText"], question["questionAnswer"])
+            if not match:
+                print("! {} answered with non-matching answer for question \"{}\".\n    User answer: {}\n    Actual answer: {} ({})".format(_get_user_data(user_data, answer["userID"], secret)[
+                      "email"], question["questionText"], answer["answerText"], question["questionAnswer"]["answer"], QUESTION_TYPES[question["questionAnswer"]["type"]]))
+            if match or y_to_continue("? Accept answer?"):
+                scores[user] = scores.get(user, 0) + 1
+    highest_score_user = max(scores.items(), key=operator.itemgetter(1))[0]
+    print("! The user with the highest score is {} (score: {}). You may want to notify them that they won something!".format(
+        highest_score_user, scores[highest_score_user]))
+    return highest_score_user, scores
+
+
+def random_quiz(rng):
+    '''
+    Build an ANSWERS payload with users answering in a random order, some questions unanswered, and a mix of right, differently written, wrong and blank answers
+    '''
+    n_users = rng.randint(1, 40)
+    questions = []
+    answer_id = 0
+    for question_num in range(rng.randint(1, 12)):
+        question_type = rng.randint(0, 1)
+        key = ["Answer {}".format(question_num), "Other {}".format(question_num)][:rng.randint(1, 2)]
+        choices = [key[0], key[0].lower(), " {} ".format(key[0].upper()), ", ".join(key), '["{}"]'.format(key[0]),
+                   key[0][:-1], "wrong", "Wrong", ""]
+        user_answers = []
+        for user_id in rng.sample(range(n_users), rng.randint(0, n_users)):
+            answer_id += 1
+            user_answers.append({"userID": user_id, "answerID": answer_id,
+                                 "answerText": rng.choice(choices)})
+        questions.append({"questionText": "Question {}?".format(question_num),
+                          "questionAnswer": {"answer": key, "type": question_type},
+                          "userAnswers": user_answers})
+    user_data = {user_id: {"id": user_id, "email": "user{}@example.com".format(user_id)}
+                 for user_id in range(n_users)}
+    return {"quizNumber": 1, "questions": questions}, user_data
+
+
+def run(grade, answers_data, user_data, seed, monkeypatch, capsys):
+    '''
+    Grade with prompts answered from a seeded random sequence; return the prompts, what was printed, and the result (or the exception)
+    '''
+    rng = random.Random(seed)
+    prompts = []
+
+    def fake_input(prompt=""):
+        prompts.append(prompt)
+        return rng.choice(["y", "Y", "n", ""])
+
+    monkeypatch.setattr(builtins, "input", fake_input)
+    try:
+        result = grade(dict(user_data), None, answers_data)
+    except ValueError as e:
+        # Nobody scored, so there is no winner
+        result = type(e)
+    printed = capsys.readouterr().out
+    return prompts, printed, result
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+@pytest.mark.parametrize("seed", range(30))
+def test_grade_answers_matches_original(seed, use_numpy, monkeypatch, capsys):
+    if use_numpy and grading.np is None:
+        pytest.skip("numpy is not installed")
+    if not use_numpy:
+        monkeypatch.setattr(grading, "np", None)
+    answers_data, user_data = random_quiz(random.Random(seed))
+    expected = run(original_check_user_answers, answers_data,
+                   user_data, seed, monkeypatch, capsys)
+    actual = run(lambda user_data, secret, answers_data: common.check_user_answers(user_data, secret, answers_data),
+                 answers_data, user_data, seed, monkeypatch, capsys)
+    assert actual == expected
+    if isinstance(expected[2], tuple):
+        # Equal dicts can still be in a different order
+        assert list(actual[2][1].items()) == list(expected[2][1].items())
+
+
+def bonus_question_quiz(quiz_number, key):
+    return {"quizNumber": quiz_number, "questions": [{"questionText": "Bonus question", "questionAnswer": {"answer": [key], "type": 0},
+                                                      "userAnswers": [{"userID": 1, "answerID": 1, "answerText": "Paris"}]}]}
+
+
+def test_review_decisions_only_apply_to_the_same_answer_key(tmp_path, capsys):
+    user_data = {1: {"id": 1, "email": "user1@example.com"}}
+    queue = str(tmp_path / "quiz-41.jsonl")
+    grading.grade_answers_deferred(
+        bonus_question_quiz(41, "Lyon"), user_data, None, queue)
+    with open(queue) as f:
+        entries = [json.loads(line) for line in f]
+    for entry in entries:
+        entry["accept"] = True
+    with open(queue, "w") as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in entries)
+    decisions = grading.load_decisions(queue)
+
+    _, scores, pending = grading.grade_answers_deferred(bonus_question_quiz(
+        41, "Lyon"), user_data, None, str(tmp_path / "again.jsonl"), decisions)
+    assert (scores, pending) == ({"user1@example.com": 1}, 0)
+    # The same question text with another answer key is a different question
+    _, scores, pending = grading.grade_answers_deferred(bonus_question_quiz(
+        42, "Nice"), user_data, None, str(tmp_path / "quiz-42.jsonl"), decisions)
+    assert (scores, pending) == ({}, 1)
@@ -0,0 +1,48 @@
+'''
+Importing the CLI must stay cheap: no heavy dependencies pulled in, and the package's own imports within a time budget.
+'''
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULE = "gfm_trivia_helper.cli"
+# Seconds the import may take; the fastest of RUNS fresh interpreters counts
+BUDGET = 0.05
+RUNS = 5
+# Modules that only the code paths needing them should import
+HEAVY_MODULES = ("requests", "urllib3", "zmtools", "PyQt5",
+                 "numpy", "pyarrow", "zstandard", "ijson", "yaml")
+
+
+def measure(module, runs):
+    '''
+    Import module in fresh interpreters and return the best cumulative import time of the package in seconds, and the top-level modules imported along the way
+    '''
+    best = None
+    imported = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+                                cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+        total = 0
+        for line in output.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            if not cumulative.strip().isdigit():
+                continue
+            imported.add(name.strip().split(".")[0])
+            # Only count the package's outermost imports; the rest are nested within them
+            if name.startswith(" gfm_trivia_helper"):
+                total += int(cumulative)
+        seconds = total / 1000000
+        best = seconds if best is None else min(best, seconds)
+    return best, imported
+
+
+def test_cli_import_is_cheap():
+    seconds, imported = measure(MODULE, RUNS)
+    assert not imported.intersection(HEAVY_MODULES)
+    assert seconds <= BUDGET, "{} imports in {:.1f}ms (budget {:.1f}ms)".format(
+        MODULE, seconds * 1000, BUDGET * 1000)
@@ -0,0 +1,35 @@
+'''
+Every user should count once per run: as a miss if it had to be fetched, otherwise as a hit.
+'''
+import pytest
+
+from gfm_trivia_helper.metrics import METRICS
+
+COMMANDS = {
+    "answers": lambda tmp_path: ["answers", "1", "2"],
+    "export": lambda tmp_path: ["export", "1", "2", "--output-dir", str(tmp_path)],
+    "grade": lambda tmp_path: ["grade", "1", "2", "--processes", "1", "--review-dir", str(tmp_path)],
+}
+USERS = 30
+
+
+def _lookups():
+    user_cache = METRICS.snapshot()["user_cache"]
+    return user_cache["hits"], user_cache["misses"]
+
+
+@pytest.mark.parametrize("command", sorted(COMMANDS))
+def test_cold_run_counts_each_user_as_one_miss(command, run_cli, api, tmp_path, capsys):
+    METRICS.reset()
+    run_cli("--no-user-cache", *COMMANDS[command](tmp_path))
+    assert _lookups() == (0, USERS)
+    assert api.requests["USER"] == USERS
+
+
+@pytest.mark.parametrize("command", sorted(COMMANDS))
+def test_warm_run_counts_each_user_as_one_hit(command, run_cli, api, tmp_path, capsys):
+    run_cli(*COMMANDS[command](tmp_path))
+    METRICS.reset()
+    run_cli(*COMMANDS[command](tmp_path))
+    assert _lookups() == (USERS, 0)
+    assert api.requests["USER"] == USERS